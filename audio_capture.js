@@ -0,0 +1,176 @@
+// audio_capture.js
+// Captures microphone audio as 16 kHz mono PCM16 in the browser, so uploads are
+// small and the server can hand them to Whisper without decoding or resampling.
+
+const TARGET_SAMPLE_RATE = 16000;
+const PCM_CONTENT_TYPE = `audio/L16;rate=${TARGET_SAMPLE_RATE};channels=1`;
+
+// Runs on the audio thread: downmix, low-pass, resample to 16 kHz, convert to Int16
+const PCM_WORKLET_SOURCE = `
+class PcmEncoder extends AudioWorkletProcessor {
+    constructor() {
+        super();
+        this.ratio = sampleRate / ${TARGET_SAMPLE_RATE};
+        this.alpha = 1 - Math.exp(-2 * Math.PI * 7000 / sampleRate);
+        this.filtered = 0;
+        this.prev = 0;
+        this.pos = 0;
+        this.out = new Int16Array(1600);
+        this.outLength = 0;
+        // The main thread asks for the partly filled buffer when recording stops
+        this.port.onmessage = () => {
+            if (this.outLength) {
+                const rest = this.out.slice(0, this.outLength);
+                this.port.postMessage(rest.buffer, [rest.buffer]);
+                this.outLength = 0;
+            }
+        };
+    }
+
+    emit(sample) {
+        const clamped = Math.max(-1, Math.min(1, sample));
+        this.out[this.outLength++] = clamped < 0 ? clamped * 0x8000 : clamped * 0x7fff;
+        if (this.outLength === this.out.length) {
+            this.port.postMessage(this.out.buffer, [this.out.buffer]);
+            this.out = new Int16Array(1600);
+            this.outLength = 0;
+        }
+    }
+
+    process(inputs) {
+        const input = inputs[0];
+        if (!input || input.length === 0) {
+            return true;
+        }
+
+        const n = input[0].length;
+        const mono = new Float32Array(n);
+        for (const channel of input) {
+            for (let i = 0; i < n; i++) {
+                mono[i] += channel[i] / input.length;
+            }
+        }
+
+        // One-pole low-pass keeps content above ~7 kHz from aliasing
+        for (let i = 0; i < n; i++) {
+            this.filtered += this.alpha * (mono[i] - this.filtered);
+            mono[i] = this.filtered;
+        }
+
+        // Linear interpolation; index -1 refers to the last sample of the previous block
+        while (this.pos < n - 1) {
+            const i = Math.floor(this.pos);
+            const a = i < 0 ? this.prev : mono[i];
+            this.emit(a + (mono[i + 1] - a) * (this.pos - i));
+            this.pos += this.ratio;
+        }
+        this.pos -= n;
+        this.prev = mono[n - 1];
+        return true;
+    }
+}
+
+registerProcessor('pcm-encoder', PcmEncoder);
+`;
+
+class PcmRecorder {
+    static isSupported() {
+        return typeof AudioWorkletNode !== 'undefined';
+    }
+
+    // onChunk(blob) is called every chunkMs with the newest PCM16 audio (optional)
+    constructor({ onChunk = null, chunkMs = 1000 } = {}) {
+        this.onChunk = onChunk;
+        this.chunkMs = chunkMs;
+        this.pending = [];
+        this.recorded = [];
+    }
+
+    async start(stream) {
+        this.context = new AudioContext();
+        const moduleUrl = URL.createObjectURL(new Blob([PCM_WORKLET_SOURCE], { type: 'application/javascript' }));
+        await this.context.audioWorklet.addModule(moduleUrl);
+        URL.revokeObjectURL(moduleUrl);
+
+        this.source = this.context.createMediaStreamSource(stream);
+        this.node = new AudioWorkletNode(this.context, 'pcm-encoder');
+        this.node.port.onmessage = (event) => {
+            const samples = new Int16Array(event.data);
+            this.pending.push(samples);
+            this.recorded.push(samples);
+        };
+        this.source.connect(this.node);
+        // The node writes no output; connecting it just keeps the graph pulling audio through it
+        this.node.connect(this.context.destination);
+
+        if (this.onChunk) {
+            this.timer = setInterval(() => this.flush(), this.chunkMs);
+        }
+    }
+
+    // audio/L16 is big-endian PCM (RFC 2586)
+    static toL16(pieces) {
+        const total = pieces.reduce((sum, piece) => sum + piece.length, 0);
+        const view = new DataView(new ArrayBuffer(total * 2));
+        let offset = 0;
+        for (const piece of pieces) {
+            for (let i = 0; i < piece.length; i++, offset += 2) {
+                view.setInt16(offset, piece[i], false);
+            }
+        }
+        return new Blob([view.buffer], { type: PCM_CONTENT_TYPE });
+    }
+
+    static toWav(pieces) {
+        const total = pieces.reduce((sum, piece) => sum + piece.length, 0);
+        const view = new DataView(new ArrayBuffer(44 + total * 2));
+        const writeString = (offset, text) => {
+            for (let i = 0; i < text.length; i++) {
+                view.setUint8(offset + i, text.charCodeAt(i));
+            }
+        };
+
+        writeString(0, 'RIFF');
+        view.setUint32(4, 36 + total * 2, true);
+        writeString(8, 'WAVE');
+        writeString(12, 'fmt ');
+        view.setUint32(16, 16, true);
+        view.setUint16(20, 1, true);                       // PCM
+        view.setUint16(22, 1, true);                       // mono
+        view.setUint32(24, TARGET_SAMPLE_RATE, true);
+        view.setUint32(28, TARGET_SAMPLE_RATE * 2, true);  // byte rate
+        view.setUint16(32, 2, true);                       // block align
+        view.setUint16(34, 16, true);                      // bits per sample
+        writeString(36, 'data');
+        view.setUint32(40, total * 2, true);
+
+        let offset = 44;
+        for (const piece of pieces) {
+            for (let i = 0; i < piece.length; i++, offset += 2) {
+                view.setInt16(offset, piece[i], true);
+            }
+        }
+        return new Blob([view.buffer], { type: 'audio/wav' });
+    }
+
+    flush() {
+        if (this.pending.length && this.onChunk) {
+            const blob = PcmRecorder.toL16(this.pending);
+            this.pending = [];
+            this.onChunk(blob);
+        }
+    }
+
+    // Stops capture and returns the whole recording as a 16 kHz mono WAV blob
+    async stop() {
+        clearInterval(this.timer);
+        this.node.port.postMessage('flush');
+        // Give the audio thread a moment to deliver its last buffers
+        await new Promise(resolve => setTimeout(resolve, 50));
+        this.source.disconnect();
+        this.node.disconnect();
+        this.flush();
+        await this.context.close();
+        return PcmRecorder.toWav(this.recorded);
+    }
+}
@@ -0,0 +1,96 @@
+// audio_playback.js
+// Plays assistant replies in the browser sentence by sentence: the first sentence
+// starts as soon as it is synthesized while the server renders the rest.
+
+class SpeechPlayer {
+    constructor() {
+        this.generation = 0;
+        this.current = null;
+        this.settleCurrent = null;
+    }
+
+    stop() {
+        this.generation++;
+        if (this.current) {
+            this.current.pause();
+            this.current = null;
+        }
+        // A paused Audio never fires 'ended', so settle the superseded play() here;
+        // it then sees the new generation and returns instead of staying suspended
+        if (this.settleCurrent) {
+            this.settleCurrent();
+            this.settleCurrent = null;
+        }
+    }
+
+    async play(text) {
+        this.stop();
+        const generation = this.generation;
+
+        let segments;
+        try {
+            const response = await fetch('/tts/plan', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ text: text })
+            });
+            segments = (await response.json()).segments;
+        } catch (error) {
+            console.error('Speech planning failed:', error);
+            return;
+        }
+        if (!segments || generation !== this.generation) {
+            return;
+        }
+
+        // Each sentence is fetched one ahead of playback so gaps stay short
+        const load = (segment) => {
+            const audio = new Audio(segment.url);
+            audio.preload = 'auto';
+            return audio;
+        };
+        const release = (audio) => {
+            if (audio) {
+                audio.onended = audio.onerror = null;
+                audio.removeAttribute('src');
+                audio.load();  // aborts a download still in progress
+            }
+        };
+
+        let next = load(segments[0]);
+        for (let i = 0; i < segments.length; i++) {
+            const audio = next;
+            next = i + 1 < segments.length ? load(segments[i + 1]) : null;
+            if (generation !== this.generation) {
+                release(audio);
+                release(next);
+                return;
+            }
+
+            this.current = audio;
+            try {
+                await new Promise((resolve, reject) => {
+                    this.settleCurrent = resolve;
+                    audio.onended = resolve;
+                    audio.onerror = reject;
+                    audio.play().catch(reject);
+                });
+            } catch (error) {
+                // pause() from stop() also rejects a play() that had not started yet
+                if (generation === this.generation) {
+                    console.error('Audio playback failed:', error);
+                }
+                release(audio);
+                release(next);
+                return;
+            }
+            release(audio);
+            if (generation !== this.generation) {
+                release(next);
+                return;
+            }
+        }
+        this.current = null;
+        this.settleCurrent = null;
+    }
+}
@@ -0,0 +1,91 @@
+"""Compare the single-pass intent matcher with the old per-pattern re.match loop.
+
+Both are run over the same utterances and must agree on every one. The
+similarity matcher is then scored on held-out paraphrases, where a null
+intent means the text should be left for commands or search. Any null
+entry that a matcher claims fails the run:
+
+    python benchmarks/intent_matcher.py --number 20000
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import python as assistant_module  # noqa: E402
+
+PARAPHRASES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_corpus", "paraphrases_v1.jsonl")
+
+UTTERANCES = [
+    "hello",
+    "how are you doing today",
+    "can you search for the latest python release notes please",
+    "what is the capital of france and why is it so well known",
+    "open youtube",
+    "tell me a joke about computers",
+    "calculate 15 times 23",
+    "thanks a lot, goodbye",
+]
+
+
+def legacy_match(text):
+    """What handle_conversation did before: rebuild the table, then re.match each pattern in turn"""
+    patterns = {pattern: responses for _, pattern, responses in assistant_module.CONVERSATION_INTENTS}
+    for pattern, responses in patterns.items():
+        if re.match(pattern, text):
+            return responses
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=10000)
+    args = parser.parse_args()
+
+    matcher = assistant_module.IntentMatcher(assistant_module.CONVERSATION_INTENTS)
+
+    for text in UTTERANCES:
+        found = matcher.match(text)
+        if legacy_match(text) != (found[1] if found else None):
+            print(f"MISMATCH on {text!r}")
+            sys.exit(1)
+
+        legacy = timeit.timeit(lambda: legacy_match(text), number=args.number) / args.number * 1e6
+        single = timeit.timeit(lambda: matcher.match(text), number=args.number) / args.number * 1e6
+        print(f"{text[:40]:40s} legacy {legacy:7.2f}us  matcher {single:7.2f}us  x{legacy / single:5.1f}  "
+              f"{found[0] if found else '-'}")
+
+    with open(PARAPHRASES, encoding="utf-8") as f:
+        paraphrases = [json.loads(line) for line in f if line.strip()]
+    similarity = assistant_module.SimilarityIntentMatcher(assistant_module.INTENT_EXAMPLES,
+                                                          thresholds=assistant_module.INTENT_THRESHOLDS,
+                                                          addressed=assistant_module.ADDRESSED_INTENTS)
+    texts = [entry["text"] for entry in paraphrases]
+
+    def name(found):
+        return found[0] if found else None
+
+    regex_hits = sum(name(matcher.match(entry["text"])) == entry["intent"] for entry in paraphrases)
+    combined_hits = sum(name(matcher.match(entry["text"]) or similarity.match(entry["text"])) == entry["intent"]
+                        for entry in paraphrases)
+    single = timeit.timeit(lambda: [similarity.match(text) for text in texts], number=20) / 20 / len(texts) * 1e6
+    batch = timeit.timeit(lambda: similarity.match_batch(texts), number=20) / 20 / len(texts) * 1e6
+
+    print(f"\nparaphrases: regex {regex_hits}/{len(paraphrases)}  regex + similarity {combined_hits}/{len(paraphrases)}")
+    print(f"similarity: {single:.1f}us per text one at a time, {batch:.1f}us per text in a batch of {len(texts)}")
+    
+    false_positives = [(entry["text"], name(matcher.match(entry["text"]) or similarity.match(entry["text"])))
+                       for entry in paraphrases if entry["intent"] is None]
+    false_positives = [(text, found) for text, found in false_positives if found]
+    for text, found in false_positives:
+        print(f"FALSE POSITIVE {text!r} -> {found}")
+    if false_positives:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
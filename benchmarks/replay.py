@@ -0,0 +1,256 @@
+"""Replay a golden corpus through process_command and report per-stage and per-intent latency.
+
+HTTP calls are answered by a stub transport mounted on the assistant's shared
+session, so runs are repeatable offline.
+Exits non-zero when intents stop matching the corpus or latency regresses
+past the stored baseline. The baseline is scaled by a CPU calibration run, so
+it can be checked on a slower machine than the one that recorded it:
+
+    python benchmarks/replay.py --repeat 20
+    python benchmarks/replay.py --update-baseline
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import timeit
+from concurrent.futures import wait
+
+import requests
+from requests.adapters import BaseAdapter
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import python as assistant_module  # noqa: E402
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS = os.path.join(BENCH_DIR, "corpus", "v1.jsonl")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+PERCENTILES = (50, 95, 99)
+
+
+class StubNetwork(BaseAdapter):
+    """Transport adapter that answers Wikipedia and DuckDuckGo with canned JSON after a fixed delay"""
+
+    def __init__(self, delay_ms):
+        super().__init__()
+        self.delay = delay_ms / 1000.0
+        self.calls = 0
+
+    def send(self, request, **kwargs):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        if "wikipedia.org" in request.url:
+            status, payload = 200, {"extract": "Stub encyclopedia summary used by the replay benchmark. " * 4}
+        elif "duckduckgo.com" in request.url:
+            status, payload = 200, {"AbstractText": "Stub search abstract used by the replay benchmark."}
+        else:
+            status, payload = 404, {}
+
+        response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(payload).encode("utf-8")
+        response.headers["Content-Type"] = "application/json"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class SettlingExecutor:
+    """Wraps the search executor so abandoned backend calls can be waited out between utterances"""
+    
+    def __init__(self, executor):
+        self.executor = executor
+        self.futures = []
+    
+    def submit(self, fn, *args, **kwargs):
+        future = self.executor.submit(fn, *args, **kwargs)
+        self.futures.append(future)
+        return future
+    
+    def settle(self):
+        wait(self.futures)
+        self.futures.clear()
+
+
+def load_corpus(path):
+    """Corpus entries, each a text and the trace intent process_command should report for it"""
+    with open(path, encoding="utf-8") as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+    for number, entry in enumerate(corpus, 1):
+        if not isinstance(entry.get("text"), str) or not isinstance(entry.get("intent"), str):
+            raise SystemExit(f"{path}:{number}: replay entries need a text and an intent string, got {entry!r}")
+    return corpus
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    result = {}
+    for p in PERCENTILES:
+        index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+        result[f"p{p}"] = round(ordered[index] * 1000, 4)  # milliseconds
+    return result
+
+
+def replay(assistant, corpus, repeat, settle):
+    stages, intents, mismatches = {}, {}, []
+    started = time.perf_counter()
+    for run in range(repeat):
+        for entry in corpus:
+            trace = {}
+            call_started = time.perf_counter()
+            assistant.process_command(entry["text"], interrupt=False, trace=trace)
+            elapsed = time.perf_counter() - call_started
+
+            for stage, seconds in trace["stages"].items():
+                stages.setdefault(stage, []).append(seconds)
+            stages.setdefault("total", []).append(elapsed)
+            intents.setdefault(entry["intent"], []).append(elapsed)
+            if run == 0 and trace.get("intent") != entry["intent"]:
+                mismatches.append({"text": entry["text"], "expected": entry["intent"], "got": trace.get("intent")})
+            
+            # A hedged search returns before its slower backends finish; letting those finish
+            # here keeps them from running alongside (and slowing) the next timed utterance
+            settle_started = time.perf_counter()
+            settle()
+            started += time.perf_counter() - settle_started
+    wall = time.perf_counter() - started
+
+    return {
+        "utterances": len(corpus) * repeat,
+        "throughput_per_second": round(len(corpus) * repeat / wall, 1),
+        "stages": {stage: percentiles(samples) for stage, samples in sorted(stages.items())},
+        "intents": {intent: percentiles(samples) for intent, samples in sorted(intents.items())},
+        "mismatches": mismatches,
+    }
+
+
+def calibrate(rounds=5):
+    """Best time of a fixed pure-Python workload, to tell how fast this machine is next to the baseline's"""
+    def workload():
+        counts = {}
+        for i in range(100000):
+            key = f"w{i % 97}"
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+    return min(timeit.repeat(workload, number=1, repeat=rounds))
+
+
+def compare(report, baseline, tolerance, min_delta_ms, p95_floor_ms, scale=1.0):
+    """Regressions of report against baseline, as readable strings
+
+    scale stretches the baseline for a slower machine. Tail latencies of
+    utterances that take microseconds are mostly scheduler noise, so p95 is
+    only checked where the baseline's p95 reaches p95_floor_ms.
+    """
+    problems = [f"intent mismatch: {m['text']!r} expected {m['expected']} got {m['got']}" for m in report["mismatches"]]
+
+    floor = baseline["throughput_per_second"] / (1 + tolerance) / scale
+    if report["throughput_per_second"] < floor:
+        problems.append(f"throughput {report['throughput_per_second']}/s below {floor:.1f}/s")
+
+    for section in ("stages", "intents"):
+        for name, old in baseline.get(section, {}).items():
+            new = report[section].get(name)
+            if new is None:
+                continue
+            for key in ("p50", "p95"):
+                if key == "p95" and old[key] < p95_floor_ms:
+                    continue
+                expected = old[key] * scale
+                limit = max(expected * (1 + tolerance), expected + min_delta_ms)
+                if new[key] > limit:
+                    problems.append(f"{section[:-1]} {name} {key} {new[key]:.3f}ms over {limit:.3f}ms")
+    return problems
+
+
+def print_report(report):
+    print(f"{report['utterances']} utterances, {report['throughput_per_second']}/s, {report['network_calls']} stubbed HTTP calls")
+    for section in ("stages", "intents"):
+        print(f"\n{section}:")
+        for name, values in report[section].items():
+            print(f"  {name:32s} " + "  ".join(f"{key} {value:8.3f}ms" for key, value in values.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--network-ms", type=float, default=5.0, help="simulated latency of each stubbed HTTP call")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed fractional slowdown before failing")
+    parser.add_argument("--min-delta-ms", type=float, default=0.1, help="ignore slowdowns smaller than this")
+    parser.add_argument("--p95-floor-ms", type=float, default=1.0,
+                        help="only check p95 where the baseline's p95 is at least this")
+    parser.add_argument("--search-cache", action="store_true",
+                        help="keep the search result cache; by default every search reaches the stub network")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    version = os.path.splitext(os.path.basename(args.corpus))[0]
+    network = StubNetwork(args.network_ms)
+    assistant_module.webbrowser.open = lambda url: True
+
+    # Notes and caches go to a scratch directory instead of the working tree
+    os.chdir(tempfile.mkdtemp(prefix="replay-"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        assistant = assistant_module.FreeVoiceAIAssistant(text_only=True)
+        assistant.http.session.mount("https://", network)
+        assistant.search_executor = SettlingExecutor(assistant.search_executor)
+        if not args.search_cache:
+            assistant.search_cache = assistant_module.LRUCache(0, expiring=True)
+        replay(assistant, corpus, 1, assistant.search_executor.settle)  # warm-up
+        report = replay(assistant, corpus, args.repeat, assistant.search_executor.settle)
+    report["network_calls"] = network.calls
+    report["calibration_seconds"] = round(calibrate(), 5)
+
+    print_report(report)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baselines = json.load(f)
+
+    if args.update_baseline:
+        if report["mismatches"]:
+            print(f"\nRefusing to record a baseline with {len(report['mismatches'])} intent mismatch(es)")
+            sys.exit(1)
+        baselines[version] = {key: report[key]
+                              for key in ("throughput_per_second", "stages", "intents", "calibration_seconds")}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nBaseline for {version} written to {args.baseline}")
+        return
+
+    if version not in baselines:
+        problems = compare(report, {"throughput_per_second": 0}, args.tolerance, args.min_delta_ms, args.p95_floor_ms)
+        print(f"\nNo baseline for {version}; run with --update-baseline to record one")
+    else:
+        baseline = baselines[version]
+        # Never tighten the limits on a faster machine: the stubbed network delay does not get faster with it
+        scale = max(1.0, report["calibration_seconds"] / baseline.get("calibration_seconds", report["calibration_seconds"]))
+        if scale > 1.0:
+            print(f"\nThis machine is {scale:.2f}x slower than the baseline's; limits scaled to match")
+        problems = compare(report, baseline, args.tolerance, args.min_delta_ms, args.p95_floor_ms, scale)
+
+    if problems:
+        print(f"\n{len(problems)} regression(s):")
+        for problem in problems:
+            print(f"  {problem}")
+        sys.exit(1)
+    print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
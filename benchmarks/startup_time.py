@@ -0,0 +1,56 @@
+"""Measure cold-start time of the assistant in text-only and voice modes.
+
+Each run happens in a fresh interpreter so import costs are included:
+
+    python benchmarks/startup_time.py --runs 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Voice mode is measured with the engines loaded eagerly, which is what every start paid before.
+# setup_stt/setup_tts are called directly: setup_voice_engines swallows errors, so a missing
+# engine would otherwise be timed as a fast successful start.
+SNIPPETS = {
+    "text-only": (
+        "import time; t = time.perf_counter(); import python; "
+        "python.FreeVoiceAIAssistant(text_only=True); "
+        "print(time.perf_counter() - t)"
+    ),
+    "voice (eager load)": (
+        "import time; t = time.perf_counter(); import python; "
+        "a = python.FreeVoiceAIAssistant(preload_voice=False); a.stt_workers = 0; a.setup_stt(); a.setup_tts(); "
+        "print(time.perf_counter() - t)"
+    ),
+}
+
+
+def measure(snippet, runs):
+    timings = []
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-c", snippet], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True)
+        timings.append(float(proc.stdout.strip().splitlines()[-1]))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    
+    for name, snippet in SNIPPETS.items():
+        try:
+            timings = measure(snippet, args.runs)
+        except subprocess.CalledProcessError as e:
+            print(f"{name:20s} failed: {e.stderr.strip().splitlines()[-1] if e.stderr.strip() else e}")
+            continue
+        print(f"{name:20s} median {statistics.median(timings):7.3f}s  min {min(timings):7.3f}s  max {max(timings):7.3f}s")
+
+
+if __name__ == "__main__":
+    main()
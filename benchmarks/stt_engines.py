@@ -0,0 +1,86 @@
+"""Benchmark every speech-to-text engine on the same audio clips.
+
+Clips are WAV/WebM/Ogg files in a directory; an optional ``<clip>.txt`` next
+to a clip holds its expected transcript:
+
+    python benchmarks/stt_engines.py --clips path/to/clips --runs 3
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import python as assistant_module  # noqa: E402
+
+AUDIO_EXTENSIONS = (".wav", ".webm", ".ogg", ".opus", ".mp3", ".m4a")
+
+
+def normalize(text):
+    return re.sub(r"[^a-z0-9 ]", "", (text or "").lower()).split()
+
+
+def load_clips(directory):
+    clips = []
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith(AUDIO_EXTENSIONS):
+            continue
+        path = os.path.join(directory, name)
+        with open(path, "rb") as f:
+            audio = assistant_module.decode_audio(f.read())
+        expected_path = os.path.splitext(path)[0] + ".txt"
+        expected = None
+        if os.path.exists(expected_path):
+            with open(expected_path, encoding="utf-8") as f:
+                expected = f.read().strip()
+        clips.append((name, audio, expected))
+    return clips
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clips", required=True, help="directory of audio clips")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    
+    assistant = assistant_module.FreeVoiceAIAssistant(preload_voice=False)
+    assistant.stt_workers = 0  # time the model itself, not the process pool hop
+    clips = load_clips(args.clips)
+    
+    for engine in assistant.stt_engines:
+        if not engine.is_available():
+            print(f"\n{engine.name}: not available, skipped")
+            continue
+        
+        print(f"\n{engine.name}")
+        timings, handled, correct, labelled = [], 0, 0, 0
+        for name, audio, expected in clips:
+            speech, _ = assistant.vad.trim(audio)
+            if len(speech) == 0:
+                continue
+            
+            engine.transcribe(speech)  # warm-up
+            runs = []
+            for _ in range(args.runs):
+                started = time.perf_counter()
+                result = engine.transcribe(speech)
+                runs.append(time.perf_counter() - started)
+            timings.append(statistics.median(runs))
+            
+            text = result["text"] if result else None
+            handled += result is not None
+            if expected is not None and result is not None:
+                labelled += 1
+                correct += normalize(text) == normalize(expected)
+            print(f"  {name:30s} {1000 * timings[-1]:9.1f} ms  {text!r}")
+        
+        if timings:
+            print(f"  handled {handled}/{len(timings)} clips, median {1000 * statistics.median(timings):.1f} ms"
+                  + (f", exact match {correct}/{labelled}" if labelled else ""))
+
+
+if __name__ == "__main__":
+    main()
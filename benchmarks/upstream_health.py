@@ -0,0 +1,171 @@
+"""Check the upstream circuit breaker through a brownout and a probe recovery.
+
+The breaker is driven directly for its state transitions, then through the
+assistant's fetch path with a stub transport that fails or answers on demand.
+Requests that were in flight when the circuit opened must not extend its
+cool-down. Any failed check fails the run:
+
+    python benchmarks/upstream_health.py
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+from requests.adapters import BaseAdapter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import python as assistant_module  # noqa: E402
+
+
+class FlakyNetwork(BaseAdapter):
+    """Transport adapter that refuses connections while failing is set, and answers DuckDuckGo otherwise"""
+
+    def __init__(self):
+        super().__init__()
+        self.failing = False
+        self.delays = {}  # query -> seconds to wait before answering or failing
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        with self.lock:
+            self.calls += 1
+        query = requests.utils.unquote(request.url.split("q=", 1)[1].split("&", 1)[0])
+        time.sleep(self.delays.get(query, 0))
+        if self.failing:
+            raise requests.ConnectionError("stub upstream is down")
+
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps({"AbstractText": f"Stub abstract for {query}."}).encode("utf-8")
+        response.headers["Content-Type"] = "application/json"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def check_transitions(cooldown, problems):
+    """Straggler outcomes while open or half-open must not move the circuit; only the probe does"""
+    health = assistant_module.UpstreamHealth("stub", cooldown=cooldown)
+    for _ in range(health.max_failures_in_row):
+        health.record_failure(0.01, health.allow())
+    if health.state != "open":
+        problems.append(f"{health.max_failures_in_row} failures in a row left the circuit {health.state}")
+    opened_at = health.opened_at
+
+    time.sleep(cooldown / 4)
+    health.record_failure(0.01, "closed")
+    if health.opened_at != opened_at or health.counts["opened"] != 1:
+        problems.append("a straggler failure while open reset the cool-down")
+    health.record_success(0.01, "closed")
+    if health.state != "open":
+        problems.append("a straggler success while open closed the circuit")
+    if health.allow() is not None:
+        problems.append("a request was admitted during the cool-down")
+
+    time.sleep(cooldown)
+    admitted = health.allow()
+    if admitted != "half_open":
+        problems.append(f"after the cool-down the first request was admitted as {admitted!r}, not as the probe")
+    if health.allow() is not None:
+        problems.append("a second request was admitted while the probe was out")
+    health.record_failure(0.01, "closed")
+    health.record_success(0.01, "closed")
+    if health.state != "half_open":
+        problems.append(f"a straggler outcome moved the half-open circuit to {health.state}")
+
+    health.record_failure(0.01, admitted)
+    if health.state != "open" or health.counts["opened"] != 2:
+        problems.append("a failed probe did not open the circuit again")
+    time.sleep(cooldown)
+    health.record_success(0.01, health.allow())
+    if health.state != "closed":
+        problems.append("a successful probe did not close the circuit")
+
+
+def check_brownout(assistant, network, cooldown, problems):
+    """Concurrent failures open the circuit once; calls are refused until a probe finds the backend back up"""
+    health = assistant_module.UpstreamHealth("duckduckgo", cooldown=cooldown)
+    assistant.upstream_health["duckduckgo"] = health
+    network.failing = True
+    # Staggered so the last three fail after the fifth has already opened the circuit
+    step = 0.05
+    queries = [f"brownout {i}" for i in range(health.max_failures_in_row + 3)]
+    network.delays = {query: i * step for i, query in enumerate(queries)}
+
+    def fetch(query):
+        try:
+            assistant.fetch_duckduckgo(query)
+        except assistant_module.UpstreamError:
+            pass
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=fetch, args=(query,)) for query in queries]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    network.delays = {}
+
+    if health.state != "open" or health.counts["opened"] != 1:
+        problems.append(f"brownout left the circuit {health.state} after opening {health.counts['opened']} time(s)")
+    opened_after = health.opened_at - started
+    if opened_after > (health.max_failures_in_row - 0.5) * step:
+        problems.append(f"stragglers pushed the cool-down out: opened {opened_after * 1000:.0f}ms in")
+
+    calls = network.calls
+    for query in queries:
+        fetch(query)
+    if network.calls != calls:
+        problems.append(f"{network.calls - calls} request(s) reached the backend while the circuit was open")
+
+    network.failing = False
+    time.sleep(max(0.0, health.opened_at + cooldown - time.monotonic()))
+    try:
+        answer = assistant.fetch_duckduckgo("recovered")
+    except assistant_module.UpstreamError as e:
+        answer = None
+        problems.append(f"the probe after the cool-down failed: {e}")
+    if health.state != "closed" or not answer:
+        problems.append(f"a successful probe left the circuit {health.state}")
+    if network.calls != calls + 1:
+        problems.append(f"recovery took {network.calls - calls} request(s), not a single probe")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cooldown", type=float, default=0.4, help="circuit cool-down in seconds")
+    args = parser.parse_args()
+
+    problems = []
+    check_transitions(args.cooldown, problems)
+
+    network = FlakyNetwork()
+    # Notes and caches go to a scratch directory instead of the working tree
+    os.chdir(tempfile.mkdtemp(prefix="upstream-health-"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        assistant = assistant_module.FreeVoiceAIAssistant(text_only=True)
+    assistant.http.session.mount("https://", network)
+    assistant.http.retries = 0
+    check_brownout(assistant, network, args.cooldown, problems)
+
+    for problem in problems:
+        print(f"FAIL {problem}")
+    if problems:
+        sys.exit(1)
+    print("Circuit breaker: brownout opened once, stragglers ignored, probe recovered")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,2196 @@
 # voice_ai_assistant_web.py
-import speech_recognition as sr
-import pyttsx3
-import whisper
+# Heavy voice dependencies (whisper/torch, speech_recognition, pyttsx3) are imported
+# lazily on first voice use so text-only deployments start without them.
+import numpy as np
 import requests
 import webbrowser
 import json
 import os
+import io
+import wave
+import subprocess
 import threading
+import queue
 import re
 import time
 import random
+import hashlib
+import unicodedata
+import tempfile
+import argparse
+import uuid
+import struct
+import sqlite3
+import gzip
+import asyncio
+import xml.etree.ElementTree as ET
+from collections import Counter, OrderedDict, deque
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 from urllib.parse import quote
-from flask import Flask, render_template_string, request, jsonify, send_file
+from flask import Flask, render_template_string, request, jsonify, send_file, Response, stream_with_context
 from flask_cors import CORS
 
-class FreeVoiceAIAssistant:
+# ===== AUDIO DECODING =====
+
+SAMPLE_RATE = 16000  # Whisper works on 16 kHz mono float32
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+MAX_TTS_CHARS = 2000
+
+
+class AudioDecodeError(ValueError):
+    """Raised when uploaded audio cannot be decoded"""
+
+
+def pcm16_to_float32(data):
+    """Convert little-endian 16-bit PCM bytes to float32 samples in [-1, 1]"""
+    return np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768.0
+
+
+def resample_audio(audio, orig_rate, target_rate=SAMPLE_RATE):
+    """Resample a mono float32 buffer with a windowed-sinc low-pass and linear interpolation"""
+    if orig_rate == target_rate or len(audio) == 0:
+        return audio.astype(np.float32, copy=False)
+    
+    if orig_rate > target_rate:
+        # Low-pass below the new Nyquist frequency so downsampling does not alias
+        cutoff = 0.5 * target_rate / orig_rate
+        taps = np.arange(-32, 33)
+        kernel = 2 * cutoff * np.sinc(2 * cutoff * taps) * np.hamming(len(taps))
+        audio = np.convolve(audio, kernel / kernel.sum(), mode="same")
+    
+    target_length = int(round(len(audio) * target_rate / orig_rate))
+    positions = np.arange(target_length) * (orig_rate / target_rate)
+    return np.interp(positions, np.arange(len(audio)), audio).astype(np.float32)
+
+
+def pcm_frames_to_float32(frames, width, channels, big_endian=False):
+    """Convert interleaved integer PCM frames to mono float32 samples in [-1, 1]"""
+    if width == 1:
+        audio = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        audio = np.frombuffer(frames, dtype=">i2" if big_endian else "<i2").astype(np.float32) / 32768.0
+    elif width == 3:
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3)
+        ints = (raw[:, 0].astype(np.int32) | (raw[:, 1].astype(np.int32) << 8) | (raw[:, 2].astype(np.int32) << 16))
+        ints = np.where(ints >= 1 << 23, ints - (1 << 24), ints)
+        audio = ints.astype(np.float32) / float(1 << 23)
+    elif width == 4:
+        audio = np.frombuffer(frames, dtype="<i4").astype(np.float32) / float(1 << 31)
+    else:
+        raise AudioDecodeError(f"Unsupported PCM sample width: {width}")
+    
+    if channels > 1:
+        audio = audio[: len(audio) - len(audio) % channels].reshape(-1, channels).mean(axis=1)
+    return audio
+
+
+def decode_wav(data):
+    """Decode PCM WAV bytes in-process"""
+    try:
+        with wave.open(io.BytesIO(data)) as wav:
+            channels = wav.getnchannels()
+            width = wav.getsampwidth()
+            rate = wav.getframerate()
+            frames = wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError) as e:
+        raise AudioDecodeError(f"Invalid WAV data: {e}")
+    
+    return resample_audio(pcm_frames_to_float32(frames, width, channels), rate)
+
+
+def decode_compressed(data):
+    """Decode WebM/Ogg/MP4 audio in memory, returning 16 kHz mono float32"""
+    try:
+        import av
+    except ImportError:
+        av = None
+    
+    if av is not None:
+        try:
+            chunks = []
+            resampler = av.AudioResampler(format="s16", layout="mono", rate=SAMPLE_RATE)
+            with av.open(io.BytesIO(data)) as container:
+                for frame in container.decode(audio=0):
+                    for out in resampler.resample(frame) or []:
+                        chunks.append(out.to_ndarray().tobytes())
+            for out in resampler.resample(None) or []:
+                chunks.append(out.to_ndarray().tobytes())
+            return pcm16_to_float32(b"".join(chunks))
+        except Exception as e:
+            raise AudioDecodeError(f"Could not decode audio: {e}")
+    
+    # Without PyAV, pipe the bytes through ffmpeg's stdin/stdout so nothing touches the disk
+    try:
+        proc = subprocess.run(
+            ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", "pipe:0",
+             "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1"],
+            input=data, capture_output=True, check=True
+        )
+    except FileNotFoundError:
+        raise AudioDecodeError("Compressed audio needs PyAV or ffmpeg installed")
+    except subprocess.CalledProcessError as e:
+        raise AudioDecodeError(f"Could not decode audio: {e.stderr.decode(errors='ignore').strip()}")
+    return pcm16_to_float32(proc.stdout)
+
+
+def parse_content_type(content_type):
+    """Split 'audio/L16;rate=16000;channels=1' into ('audio/l16', {'rate': '16000', 'channels': '1'})"""
+    parts = [part.strip() for part in (content_type or "").split(";")]
+    params = {}
+    for part in parts[1:]:
+        if "=" in part:
+            key, value = part.split("=", 1)
+            params[key.strip().lower()] = value.strip().strip('"')
+    return parts[0].lower(), params
+
+
+def l16_format(params):
+    """(rate, channels) of an audio/L16 upload"""
+    try:
+        rate = int(params.get("rate", SAMPLE_RATE))
+        channels = int(params.get("channels", 1))
+    except ValueError:
+        raise AudioDecodeError("Invalid audio/L16 parameters")
+    if rate <= 0 or channels <= 0:
+        raise AudioDecodeError("Invalid audio/L16 parameters")
+    return rate, channels
+
+
+def decode_l16(data, params):
+    """Decode raw big-endian 16-bit PCM (audio/L16, RFC 2586)"""
+    rate, channels = l16_format(params)
+    usable = len(data) - len(data) % (2 * channels)
+    return resample_audio(pcm_frames_to_float32(data[:usable], 2, channels, big_endian=True), rate)
+
+
+def decode_audio(data, content_type=None):
+    """Decode uploaded audio bytes to a 16 kHz mono float32 NumPy buffer"""
+    if not data:
+        raise AudioDecodeError("Empty audio upload")
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise AudioDecodeError(f"Audio upload exceeds {MAX_UPLOAD_BYTES} bytes")
+    
+    mimetype, params = parse_content_type(content_type)
+    if mimetype == "audio/l16":
+        # What the browser capture sends: already 16 kHz mono, so this is just a copy
+        return decode_l16(data, params)
+    if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+        return decode_wav(data)
+    return decode_compressed(data)
+
+
+class PCMStreamDecoder:
+    """Decodes raw PCM as it arrives; a frame split across chunks waits for the rest"""
+    
+    def __init__(self, rate, channels, width, big_endian=False):
+        self.rate = rate
+        self.channels = channels
+        self.width = width
+        self.big_endian = big_endian
+        self._pending = b""
+    
+    def feed(self, data):
+        """New 16 kHz mono samples decoded from data"""
+        data = self._pending + data
+        usable = len(data) - len(data) % (self.width * self.channels)
+        self._pending = data[usable:]
+        audio = pcm_frames_to_float32(data[:usable], self.width, self.channels, self.big_endian)
+        return resample_audio(audio, self.rate)
+    
+    def finish(self):
+        return np.zeros(0, dtype=np.float32)
+    
+    def close(self):
+        pass
+
+
+class WAVStreamDecoder:
+    """Reads a WAV header once, then decodes the data chunk incrementally like raw PCM"""
+    
+    def __init__(self):
+        self._header = b""
+        self._pcm = None
+    
+    def feed(self, data):
+        if self._pcm is not None:
+            return self._pcm.feed(data)
+        
+        self._header += data
+        fmt, offset = None, 12
+        while offset + 8 <= len(self._header):
+            chunk_id = self._header[offset:offset + 4]
+            size = int.from_bytes(self._header[offset + 4:offset + 8], "little")
+            if chunk_id == b"data":
+                if fmt is None:
+                    raise AudioDecodeError("Invalid WAV data: data chunk before fmt chunk")
+                self._pcm = PCMStreamDecoder(*fmt)
+                rest, self._header = self._header[offset + 8:], b""
+                return self._pcm.feed(rest)
+            if offset + 8 + size > len(self._header):
+                break
+            if chunk_id == b"fmt ":
+                body = self._header[offset + 8:offset + 8 + size]
+                audio_format, channels = int.from_bytes(body[0:2], "little"), int.from_bytes(body[2:4], "little")
+                rate, bits = int.from_bytes(body[4:8], "little"), int.from_bytes(body[14:16], "little")
+                if audio_format not in (1, 0xFFFE) or not channels or not rate or bits not in (8, 16, 24, 32):
+                    raise AudioDecodeError("Invalid WAV data: only integer PCM can be streamed")
+                fmt = (rate, channels, bits // 8)
+            offset += 8 + size + size % 2  # chunks are padded to an even size
+        return np.zeros(0, dtype=np.float32)
+    
+    def finish(self):
+        if self._pcm is None:
+            raise AudioDecodeError("Invalid WAV data: no data chunk")
+        return self._pcm.finish()
+    
+    def close(self):
+        pass
+
+
+class FFmpegStreamDecoder:
+    """Keeps one ffmpeg process per stream, writing new bytes to its stdin and collecting PCM from stdout"""
+    
+    def __init__(self):
+        self._proc = subprocess.Popen(
+            ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", "pipe:0",
+             "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        self._output = bytearray()
+        self._lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read, name="ffmpeg-stream-reader")
+        self._reader.daemon = True
+        self._reader.start()
+    
+    def _read(self):
+        while True:
+            data = os.read(self._proc.stdout.fileno(), 65536)
+            if not data:
+                break
+            with self._lock:
+                self._output.extend(data)
+    
+    def _take(self):
+        """Samples decoded so far and not yet returned; ffmpeg may lag the input by a frame or two"""
+        with self._lock:
+            usable = len(self._output) - len(self._output) % 2
+            data = bytes(self._output[:usable])
+            del self._output[:usable]
+        return pcm16_to_float32(data)
+    
+    def feed(self, data):
+        try:
+            self._proc.stdin.write(data)
+            self._proc.stdin.flush()
+        except OSError:
+            raise AudioDecodeError(f"Could not decode audio: {self._error()}")
+        return self._take()
+    
+    def finish(self):
+        try:
+            self._proc.stdin.close()
+        except OSError:
+            pass
+        self._reader.join()
+        if self._proc.wait() != 0:
+            raise AudioDecodeError(f"Could not decode audio: {self._error()}")
+        return self._take()
+    
+    def _error(self):
+        self._proc.kill()
+        self._proc.wait()
+        return self._proc.stderr.read().decode(errors="ignore").strip()
+    
+    def close(self):
+        if self._proc.poll() is None:
+            self._proc.kill()
+            self._proc.wait()
+        for pipe in (self._proc.stdin, self._proc.stdout, self._proc.stderr):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+
+
+class BufferedStreamDecoder:
+    """Fallback without an ffmpeg binary: keep the bytes and decode them once the stream is complete"""
+    
+    def __init__(self, content_type):
+        self.content_type = content_type
+        self._data = bytearray()
+    
+    def feed(self, data):
+        self._data.extend(data)
+        return np.zeros(0, dtype=np.float32)
+    
+    def finish(self):
+        return decode_audio(bytes(self._data), self.content_type)
+    
+    def close(self):
+        self._data = bytearray()
+
+
+def stream_decoder(content_type, head):
+    """Incremental decoder for an upload that arrives in chunks, chosen from its type and first bytes"""
+    mimetype, params = parse_content_type(content_type)
+    if mimetype == "audio/l16":
+        rate, channels = l16_format(params)
+        return PCMStreamDecoder(rate, channels, 2, big_endian=True)
+    if head[:4] == b"RIFF":
+        return WAVStreamDecoder()
+    try:
+        return FFmpegStreamDecoder()
+    except FileNotFoundError:
+        return BufferedStreamDecoder(content_type)
+
+
+# ===== CACHING =====
+
+class DiskCache:
+    """On-disk cache tier that evicts least recently used files beyond max_bytes"""
+    
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+    
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+    
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # mtime doubles as the LRU clock
+            return data
+        except OSError:
+            return None
+    
+    def put(self, key, data):
+        path = self._path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"❌ Cache write error: {e}")
+            return
+        
+        with self._lock:
+            self._size += len(data) - old_size
+            if self._size > self.max_bytes:
+                self._evict()
+    
+    def _evict(self):
+        entries = sorted((entry for entry in os.scandir(self.directory) if entry.is_file()),
+                         key=lambda entry: entry.stat().st_mtime)
+        for entry in entries:
+            if self._size <= self.max_bytes * 0.9:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._size -= size
+            except OSError:
+                pass
+
+
+class SqliteCache:
+    """Cache tier in a single SQLite file that evicts least recently used rows beyond max_bytes"""
+    
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, used REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+        self._size = self._db.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM entries").fetchone()[0]
+    
+    def get(self, key):
+        try:
+            with self._lock:
+                row = self._db.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                self._db.execute("UPDATE entries SET used = ? WHERE key = ?", (time.time(), key))
+                return bytes(row[0])
+        except sqlite3.Error:
+            return None
+    
+    def put(self, key, data):
+        try:
+            with self._lock:
+                row = self._db.execute("SELECT LENGTH(value) FROM entries WHERE key = ?", (key,)).fetchone()
+                self._db.execute("INSERT OR REPLACE INTO entries (key, value, used) VALUES (?, ?, ?)",
+                                 (key, sqlite3.Binary(data), time.time()))
+                self._size += len(data) - (row[0] if row else 0)
+                if self._size > self.max_bytes:
+                    self._evict()
+        except sqlite3.Error as e:
+            print(f"❌ Cache write error: {e}")
+    
+    def _evict(self):
+        rows = self._db.execute("SELECT key, LENGTH(value) FROM entries ORDER BY used").fetchall()
+        doomed = []
+        for key, size in rows:
+            if self._size <= self.max_bytes * 0.9:
+                break
+            doomed.append((key,))
+            self._size -= size
+        self._db.executemany("DELETE FROM entries WHERE key = ?", doomed)
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache bounded by total value size, with an optional DiskCache or SqliteCache tier"""
+    # With expiring=True, put() takes a ttl in seconds and entries past it read as misses.
+    # The expiry is written in front of each payload sent to the disk tier, so any tier works.
+    EXPIRY = struct.Struct(">d")
+    
+    def __init__(self, max_bytes, sizeof=len, disk=None, dumps=None, loads=None, expiring=False):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.disk = disk
+        self.dumps = dumps or (lambda value: value)
+        self.loads = loads or (lambda data: data)
+        self.expiring = expiring
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._counts = Counter()
+    
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                value, size, expires_at = self._entries[key]
+                if expires_at is None or expires_at > time.time():
+                    self._entries.move_to_end(key)
+                    self._counts["hits"] += 1
+                    return value
+                del self._entries[key]
+                self._size -= size
+                self._counts["expired"] += 1
+        
+        if self.disk is not None:
+            data = self.disk.get(key)
+            if data is not None:
+                expires_at = None
+                if self.expiring:
+                    expires_at = self.EXPIRY.unpack_from(data)[0] or None
+                    data = data[self.EXPIRY.size:]
+                if expires_at is None or expires_at > time.time():
+                    value = self.loads(data)
+                    self._store(key, value, expires_at)
+                    with self._lock:
+                        self._counts["disk_hits"] += 1
+                    return value
+        
+        with self._lock:
+            self._counts["misses"] += 1
+        return default
+    
+    def put(self, key, value, ttl=None):
+        if ttl is not None and not self.expiring:
+            raise ValueError("ttl needs a cache created with expiring=True")
+        expires_at = time.time() + ttl if ttl is not None else None
+        self._store(key, value, expires_at)
+        if self.disk is not None:
+            data = self.dumps(value)
+            if self.expiring:
+                data = self.EXPIRY.pack(expires_at or 0.0) + data
+            self.disk.put(key, data)
+    
+    def _store(self, key, value, expires_at=None):
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size, expires_at)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                self._counts["evictions"] += 1
+    
+    def stats(self):
+        with self._lock:
+            lookups = self._counts["hits"] + self._counts["disk_hits"] + self._counts["misses"]
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self._counts["hits"],
+                "disk_hits": self._counts["disk_hits"],
+                "misses": self._counts["misses"],
+                "evictions": self._counts["evictions"],
+                "expired": self._counts["expired"],
+                "hit_ratio": round((lookups - self._counts["misses"]) / lookups, 3) if lookups else 0,
+            }
+
+
+# ===== VOICE ACTIVITY DETECTION =====
+
+class EnergyVAD:
+    """Energy-based voice activity detector used to cut silence before Whisper runs"""
+    
+    def __init__(self, frame_ms=30, margin_db=12.0, min_speech_db=-45.0, min_speech_ms=90, padding_ms=200):
+        self.frame = SAMPLE_RATE * frame_ms // 1000
+        self.margin_db = margin_db
+        self.min_speech_db = min_speech_db
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.padding_frames = padding_ms // frame_ms
+    
+    def levels(self, audio):
+        """Per-frame energy in dB for a 16 kHz buffer"""
+        frames = len(audio) // self.frame
+        energy = (audio[: frames * self.frame].reshape(frames, self.frame) ** 2).mean(axis=1)
+        return 10 * np.log10(energy + 1e-10)
+    
+    def speech_mask(self, audio):
+        """Per-frame speech flags for a 16 kHz buffer"""
+        level_db = self.levels(audio)
+        if len(level_db) == 0:
+            return np.zeros(0, dtype=bool)
+        
+        # Threshold sits a margin above the recording's own noise floor, never below an absolute level
+        noise_floor = np.percentile(level_db, 10)
+        mask = level_db > max(noise_floor + self.margin_db, self.min_speech_db)
+        
+        # Drop blips too short to be speech
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+        for start, end in zip(edges[::2], edges[1::2]):
+            if end - start < self.min_speech_frames:
+                mask[start:end] = False
+        
+        # Pad each run so word onsets/offsets survive; this also bridges short pauses
+        if self.padding_frames and mask.any():
+            window = np.ones(2 * self.padding_frames + 1)
+            mask = np.convolve(mask.astype(np.float32), window, mode="same") > 0
+        
+        return mask
+    
+    def segments(self, audio):
+        """(start, end) sample ranges that contain speech"""
+        mask = self.speech_mask(audio)
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+        return [(start * self.frame, min(end * self.frame, len(audio))) for start, end in zip(edges[::2], edges[1::2])]
+    
+    def trim(self, audio):
+        """Return only the speech portions of a buffer and how many seconds were cut"""
+        segments = self.segments(audio)
+        if not segments:
+            # The relative threshold needs some silence to measure against; a clip that is all speech,
+            # or speech in steady noise, goes through whole and Whisper's no-speech check decides
+            level_db = self.levels(audio)
+            if len(level_db) and level_db.max() > self.min_speech_db:
+                return audio, 0.0
+            return np.zeros(0, dtype=np.float32), len(audio) / SAMPLE_RATE
+        
+        speech = np.concatenate([audio[start:end] for start, end in segments])
+        return speech, (len(audio) - len(speech)) / SAMPLE_RATE
+
+
+# ===== TRANSCRIPTION SCHEDULING =====
+
+WHISPER_WINDOW_SAMPLES = 30 * SAMPLE_RATE  # one Whisper decoder window
+
+
+def transcribe_batch(model, audios):
+    """Transcribe several 16 kHz buffers with one padded Whisper forward pass"""
+    import torch
+    import whisper
+    
+    texts = [None] * len(audios)
+    batched = [i for i, audio in enumerate(audios) if len(audio) <= WHISPER_WINDOW_SAMPLES]
+    
+    if batched:
+        mels = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(audios[i]), model.dims.n_mels)
+            for i in batched
+        ]).to(model.device)
+        options = whisper.DecodingOptions(fp16=model.device.type != "cpu")
+        with torch.no_grad():
+            results = whisper.decode(model, mels, options)
+        
+        for i, result in zip(batched, results):
+            # Same silence / hallucination guards transcribe() applies per window
+            if result.no_speech_prob > 0.6 and result.avg_logprob < -1.0:
+                texts[i] = ""
+            elif result.compression_ratio <= 2.4 and result.avg_logprob >= -1.0:
+                texts[i] = result.text.strip()
+    
+    # Long clips and low-confidence decodes go through the full transcribe() path
+    for i, audio in enumerate(audios):
+        if texts[i] is None:
+            texts[i] = model.transcribe(audio)["text"].strip()
+    
+    return texts
+
+
+class TranscriptionScheduler:
+    """Micro-batches concurrent transcription requests in front of a Whisper runner"""
+    
+    def __init__(self, runner, max_batch_size=8, max_wait_ms=25, workers=1):
+        self.runner = runner
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._requests = 0
+        self._total_wait = 0.0
+        self._total_run = 0.0
+        
+        for n in range(workers):
+            thread = threading.Thread(target=self._worker, name=f"stt-batcher-{n}")
+            thread.daemon = True
+            thread.start()
+    
+    def submit(self, audio):
+        """Queue a buffer for transcription and return a Future for its text"""
+        future = Future()
+        self._queue.put((audio, future, time.perf_counter()))
+        return future
+    
+    def transcribe(self, audio, timeout=None):
+        """Transcribe a buffer, blocking until its batch has run"""
+        return self.submit(audio).result(timeout)
+    
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return [item for item in batch if item[1].set_running_or_notify_cancel()]
+    
+    def _worker(self):
+        while True:
+            batch = self._collect_batch()
+            if not batch:
+                continue
+            
+            started = time.perf_counter()
+            try:
+                texts = self.runner([audio for audio, _, _ in batch])
+                for (_, future, _), text in zip(batch, texts):
+                    future.set_result(text)
+            except Exception as e:
+                print(f"❌ Transcription batch error: {e}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+            finished = time.perf_counter()
+            
+            with self._lock:
+                self._batch_sizes[len(batch)] += 1
+                self._requests += len(batch)
+                self._total_wait += sum(started - queued for _, _, queued in batch)
+                self._total_run += finished - started
+    
+    def stats(self):
+        """Queue depth and batch-size statistics"""
+        with self._lock:
+            batches = sum(self._batch_sizes.values())
+            return {
+                "queue_depth": self._queue.qsize(),
+                "requests": self._requests,
+                "batches": batches,
+                "avg_batch_size": round(self._requests / batches, 2) if batches else 0,
+                "max_batch_size_seen": max(self._batch_sizes) if batches else 0,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "avg_queue_wait_ms": round(1000 * self._total_wait / self._requests, 2) if self._requests else 0,
+                "avg_batch_run_ms": round(1000 * self._total_run / batches, 2) if batches else 0,
+            }
+
+
+# Worker-process side of the STT pool; each process loads its own Whisper model
+_worker_stt_model = None
+
+
+def _stt_worker_init(model_name, torch_threads):
+    global _worker_stt_model
+    import torch
+    import whisper
+    torch.set_num_threads(torch_threads)
+    torch.set_num_interop_threads(1)
+    _worker_stt_model = whisper.load_model(model_name)
+
+
+def _stt_worker_transcribe(audios):
+    return transcribe_batch(_worker_stt_model, audios)
+
+
+def _stt_worker_ping():
+    return os.getpid()
+
+
+class STTWorkerPool:
+    """Process pool where every worker holds its own Whisper model"""
+    
+    def __init__(self, model_name, processes, torch_threads):
+        self.model_name = model_name
+        self.processes = processes
+        self.torch_threads = torch_threads
+        self._executor = self._new_executor()
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._completed = 0
+        self._restarts = 0
+    
+    def _new_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.processes,
+            # spawn, because forking a process that already runs torch/Flask threads is unsafe
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_stt_worker_init,
+            initargs=(self.model_name, self.torch_threads)
+        )
+    
+    def _restart(self, broken):
+        """Replace a pool that lost a worker (OOM kill, crash in torch); only the first thread to notice does it"""
+        with self._lock:
+            if self._executor is not broken:
+                return
+            self._executor = self._new_executor()
+            self._restarts += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+        print("⚠️ A Whisper worker process died; started a new worker pool")
+        self.warm_up()
+    
+    def warm_up(self):
+        """Start the worker processes so model loading happens before the first request"""
+        for _ in range(self.processes):
+            self._executor.submit(_stt_worker_ping)
+    
+    def transcribe_batch(self, audios):
+        """Run one batch in a worker process and wait for its transcripts"""
+        with self._lock:
+            self._inflight += 1
+        try:
+            # One retry on a fresh pool: a dead worker breaks the executor for every later batch
+            for attempt in range(2):
+                executor = self._executor
+                try:
+                    return executor.submit(_stt_worker_transcribe, audios).result()
+                except BrokenProcessPool:
+                    if attempt:
+                        raise
+                    self._restart(executor)
+        finally:
+            with self._lock:
+                self._inflight -= 1
+                self._completed += 1
+    
+    def stats(self):
+        with self._lock:
+            return {
+                "processes": self.processes,
+                "torch_threads": self.torch_threads,
+                "inflight_batches": self._inflight,
+                "completed_batches": self._completed,
+                "restarts": self._restarts,
+            }
+    
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class StreamingTranscriptionSession:
+    """Incrementally transcribes an utterance while its audio chunks are still arriving"""
+    
+    COMMIT_SECONDS = 6  # audio older than this is transcribed once and frozen
+    PARTIAL_SECONDS = 1  # new audio needed before the next partial transcript
+    IDLE_TIMEOUT = 60
+    POLL_SECONDS = 1  # how often an idle worker checks whether its session expired
+    MAX_BYTES = MAX_UPLOAD_BYTES  # whole recording, across chunks
+    
+    def __init__(self, transcribe):
+        self.id = uuid.uuid4().hex
+        self.transcribe = transcribe
+        self.events = queue.Queue()
+        self.last_activity = time.monotonic()
+        self.finished = False
+        self.received = 0
+        self.content_type = None
+        self._chunks = queue.Queue()
+        self._committed_text = []
+        self._tail = np.zeros(0, dtype=np.float32)  # decoded audio not yet committed
+        self._partial_samples = 0  # length of the tail at the last partial transcript
+        
+        thread = threading.Thread(target=self._worker, name=f"stt-stream-{self.id[:8]}")
+        thread.daemon = True
+        thread.start()
+    
+    def add_chunk(self, data, final=False, content_type=None):
+        """Queue the next piece of the recording; False if it would take the session past MAX_BYTES"""
+        if self.received + len(data) > self.MAX_BYTES:
+            return False
+        self.received += len(data)
+        self.last_activity = time.monotonic()
+        if content_type and self.content_type is None:
+            self.content_type = content_type
+        self._chunks.put((data, final))
+        return True
+    
+    def is_expired(self):
+        return time.monotonic() - self.last_activity > self.IDLE_TIMEOUT
+    
+    def close(self, error=None):
+        """Stop the session; its worker exits within POLL_SECONDS and drops the buffered audio"""
+        if error and not self.finished:
+            self.events.put(("error", {"error": error}))
+        self.finished = True
+    
+    def _drain_chunks(self):
+        """Wait for the next chunks as (bytes, final); None once the session was closed or went idle past IDLE_TIMEOUT"""
+        while True:
+            try:
+                data, final = self._chunks.get(timeout=self.POLL_SECONDS)
+                break
+            except queue.Empty:
+                if self.finished or self.is_expired():
+                    return None
+        # Coalesce everything that arrived while the previous pass was running,
+        # so a slow transcription skips partials instead of falling behind
+        parts = [data]
+        while not final:
+            try:
+                data, final = self._chunks.get_nowait()
+            except queue.Empty:
+                break
+            parts.append(data)
+        return b"".join(parts), final
+    
+    def _quiet_split(self, audio):
+        """Pick a low-energy cut point in the last second so committed audio ends between words"""
+        frame = SAMPLE_RATE // 50
+        search = audio[-SAMPLE_RATE:]
+        frames = len(search) // frame
+        if frames < 2:
+            return len(audio)
+        energy = (search[: frames * frame].reshape(frames, frame) ** 2).mean(axis=1)
+        return len(audio) - len(search) + int(energy.argmin()) * frame
+    
+    def _text(self, tail_text=""):
+        return " ".join(part for part in self._committed_text + [tail_text] if part)
+    
+    def _extend_tail(self, audio):
+        if len(audio):
+            self._tail = np.concatenate([self._tail, audio])
+    
+    def _worker(self):
+        # Only the new bytes of each chunk are decoded, and only the uncommitted tail is kept
+        decoder = None
+        while not self.finished:
+            drained = self._drain_chunks()
+            if drained is None:
+                break
+            data, final = drained
+            try:
+                if decoder is None:
+                    decoder = stream_decoder(self.content_type, data)
+                self._extend_tail(decoder.feed(data))
+                
+                if final:
+                    self._extend_tail(decoder.finish())
+                    tail_text = self.transcribe(self._tail) if len(self._tail) else ""
+                    self.events.put(("final", {"text": self._text(tail_text)}))
+                    self.finished = True
+                    continue
+                
+                committed = len(self._tail) >= self.COMMIT_SECONDS * SAMPLE_RATE
+                if committed:
+                    cut = self._quiet_split(self._tail)
+                    self._committed_text.append(self.transcribe(self._tail[:cut]))
+                    self._tail = self._tail[cut:].copy()
+                
+                if not committed and len(self._tail) - self._partial_samples < self.PARTIAL_SECONDS * SAMPLE_RATE:
+                    continue
+                self._partial_samples = len(self._tail)
+                tail_text = self.transcribe(self._tail) if len(self._tail) >= SAMPLE_RATE // 2 else ""
+                self.events.put(("partial", {"text": self._text(tail_text)}))
+                
+            except Exception as e:
+                self.events.put(("error", {"error": str(e)}))
+                self.finished = True
+        
+        self.finished = True
+        if decoder is not None:
+            decoder.close()
+        self._tail = np.zeros(0, dtype=np.float32)
+
+
+# ===== SPEECH RECOGNITION ENGINES =====
+
+WEBSITES = {
+    "google": "https://google.com",
+    "youtube": "https://youtube.com", 
+    "github": "https://github.com",
+    "wikipedia": "https://wikipedia.org",
+    "gmail": "https://gmail.com",
+    "reddit": "https://reddit.com",
+    "twitter": "https://twitter.com",
+    "facebook": "https://facebook.com",
+    "amazon": "https://amazon.com",
+    "netflix": "https://netflix.com",
+    "news": "https://news.google.com",
+    "weather": "https://weather.com",
+}
+
+NUMBER_WORDS = {
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13,
+    "fourteen": 14, "fifteen": 15, "sixteen": 16, "seventeen": 17, "eighteen": 18,
+    "nineteen": 19, "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50, "sixty": 60,
+    "seventy": 70, "eighty": 80, "ninety": 90,
+}
+NUMBER_SCALES = {"hundred": 100, "thousand": 1000}
+
+# Short fixed utterances that process_command/handle_conversation already understand
+VOICE_COMMAND_PHRASES = [
+    "read notes", "show notes", "my notes", "notes",
+    "what time is it", "what time", "current time", "time",
+    "what date is it", "what is the date", "current date", "date", "today",
+    "help", "what can you do", "commands",
+    "hello", "hi", "hey", "how are you", "thank you", "thanks",
+    "tell me a joke", "goodbye", "bye",
+] + [f"open {site}" for site in WEBSITES]
+
+# Word pieces that can be freely combined for spoken arithmetic
+VOICE_CALCULATION_WORDS = ["calculate", "plus", "minus", "times", "divided by", "multiply", "add", "subtract"] \
+    + list(NUMBER_WORDS) + list(NUMBER_SCALES)
+
+
+def words_to_digits(text):
+    """Turn spelled-out numbers ("fifteen times three") into digits ("15 times 3")"""
+    output, current, total, in_number = [], 0, 0, False
+    
+    def flush():
+        if in_number:
+            output.append(str(total + current))
+    
+    for word in text.split():
+        if word in NUMBER_WORDS:
+            current += NUMBER_WORDS[word]
+            in_number = True
+        elif word in NUMBER_SCALES and in_number:
+            if NUMBER_SCALES[word] == 100:
+                current *= 100
+            else:
+                total, current = (total + current) * NUMBER_SCALES[word], 0
+        else:
+            flush()
+            output.append(word)
+            current, total, in_number = 0, 0, False
+    flush()
+    return " ".join(output)
+
+
+class STTEngine:
+    """Interface for pluggable speech-to-text engines
+    
+    transcribe() returns {"text": ..., "confidence": ...}, or None to let the
+    next engine in the chain handle the audio.
+    """
+    name = "base"
+    
+    def is_available(self):
+        return True
+    
+    def transcribe(self, audio):
+        raise NotImplementedError
+
+
+class WhisperEngine(STTEngine):
+    """General-purpose transcription through the batching Whisper scheduler"""
+    name = "whisper"
+    
+    def __init__(self, get_scheduler):
+        self.get_scheduler = get_scheduler
+    
+    def transcribe(self, audio):
+        return {"text": self.get_scheduler().transcribe(audio), "confidence": None}
+
+
+class CommandGrammarEngine(STTEngine):
+    """Offline small-vocabulary recognizer limited to the assistant's command phrases (needs vosk)"""
+    name = "grammar"
+    
+    def __init__(self, model_path, phrases, min_confidence=0.85, max_seconds=4.0):
+        self.model_path = model_path
+        self.grammar = json.dumps(sorted(set(phrases)) + ["[unk]"])
+        self.min_confidence = min_confidence
+        self.max_samples = int(max_seconds * SAMPLE_RATE)
+        self._model = None
+        self._recognizers = queue.Queue()
+        self._load_lock = threading.Lock()
+        self._unavailable = None
+    
+    def is_available(self):
+        if self._model is not None:
+            return True
+        if self._unavailable:
+            return False
+        
+        with self._load_lock:
+            if self._model is None and not self._unavailable:
+                try:
+                    import vosk
+                    vosk.SetLogLevel(-1)
+                    if not os.path.isdir(self.model_path):
+                        raise FileNotFoundError(f"no Vosk model at {self.model_path}")
+                    self._model = vosk.Model(self.model_path)
+                    print("⚡ Command grammar recognizer loaded!")
+                except Exception as e:
+                    self._unavailable = str(e)
+                    print(f"💡 Command grammar recognizer disabled: {e}")
+        return self._model is not None
+    
+    def _acquire_recognizer(self):
+        # Compiling the grammar is the slow part, so recognizers are pooled and reused across
+        # requests; the web server starts a thread per request, so per-thread copies would not last
+        try:
+            return self._recognizers.get_nowait()
+        except queue.Empty:
+            import vosk
+            recognizer = vosk.KaldiRecognizer(self._model, SAMPLE_RATE, self.grammar)
+            recognizer.SetWords(True)
+            return recognizer
+    
+    def transcribe(self, audio):
+        if len(audio) > self.max_samples or not self.is_available():
+            return None
+        
+        recognizer = self._acquire_recognizer()
+        try:
+            pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+            recognizer.AcceptWaveform(pcm)
+            result = json.loads(recognizer.FinalResult())
+        finally:
+            recognizer.Reset()
+            self._recognizers.put(recognizer)
+        
+        words = result.get("result", [])
+        if not words or any(word["word"] == "[unk]" for word in words):
+            return None
+        
+        confidence = min(word.get("conf", 0.0) for word in words)
+        if confidence < self.min_confidence:
+            return None
+        return {"text": words_to_digits(result.get("text", "")), "confidence": round(confidence, 3)}
+
+
+# ===== SPEECH OUTPUT =====
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?…])\s+|\n+')
+
+
+def split_sentences(text, min_chars=20, max_chars=200):
+    """Split a reply into speakable pieces so the first one can play while the rest render"""
+    pieces = []
+    for sentence in SENTENCE_BOUNDARY.split(text.strip()):
+        sentence = sentence.strip()
+        # Break run-on sentences at commas, then spaces
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(", ", 0, max_chars)
+            cut = cut + 1 if cut > min_chars else sentence.rfind(" ", 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            pieces.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if sentence:
+            pieces.append(sentence)
+    
+    # Fold fragments like "Hi!" into the next piece rather than rendering them alone
+    merged = []
+    for piece in pieces:
+        if merged and len(merged[-1]) < min_chars and len(merged[-1]) + len(piece) < max_chars:
+            merged[-1] = f"{merged[-1]} {piece}"
+        else:
+            merged.append(piece)
+    return merged
+
+
+class TTSWorker:
+    """Single thread that owns the pyttsx3 engine and works through a bounded priority queue
+    
+    Synthesis requests (someone is waiting on the audio bytes) go ahead of
+    speaker playback. Consecutive short utterances are merged, utterances that
+    waited longer than max_age are dropped, and cancel() stops speech in
+    progress when the user starts a new turn.
+    """
+    PRIORITY_SYNTHESIZE = 0
+    PRIORITY_SPEAK = 1
+    PRIORITY_BACKGROUND = 2  # cache warm-up, never ahead of live traffic
+    
+    def __init__(self, rate, volume, max_queue=32, max_age=15.0, merge_chars=120):
+        self.rate = rate
+        self.volume = volume
+        self.max_age = max_age
+        self.merge_chars = merge_chars
+        self._queue = queue.PriorityQueue(maxsize=max_queue)
+        self._seq = 0
+        self._seq_lock = threading.Lock()
+        self._generation = 0
+        self._held = None
+        self._active_reply = None
+        self._current = None
+        self._speaking = False
+        self._speech_ended = float("-inf")
+        self._cancel_requested = False
+        self._counts = Counter()
+        self._ttfa = deque(maxlen=200)
+        self._ready = Future()
+        
+        thread = threading.Thread(target=self._worker, name="tts-worker")
+        thread.daemon = True
+        thread.start()
+        self._ready.result()  # re-raises engine init errors in the caller
+    
+    def _enqueue(self, priority, job, block):
+        with self._seq_lock:
+            self._seq += 1
+            seq = self._seq
+        self._queue.put((priority, seq, job), block=block, timeout=5 if block else None)
+    
+    def speak(self, text, reply=None, merge=True):
+        """Queue text for the local speakers; returns False if the queue is full
+        
+        Sentences of one reply share a reply id, so only the reply's first
+        sentence is checked for staleness. merge=False keeps the worker from
+        holding this utterance back to absorb the ones queued after it.
+        """
+        job = {"kind": "speak", "text": text, "queued": time.perf_counter(), "generation": self._generation,
+               "reply": reply, "merge": merge}
+        try:
+            self._enqueue(self.PRIORITY_SPEAK, job, block=False)
+            return True
+        except queue.Full:
+            self._counts["dropped_full"] += 1
+            return False
+    
+    def synthesize(self, text, timeout=30, background=False):
+        """Render text to (audio bytes, mimetype), waiting for the worker"""
+        job = {"kind": "synthesize", "text": text, "queued": time.perf_counter(), "future": Future()}
+        priority = self.PRIORITY_BACKGROUND if background else self.PRIORITY_SYNTHESIZE
+        try:
+            self._enqueue(priority, job, block=True)
+        except queue.Full:
+            self._counts["dropped_full"] += 1
+            raise RuntimeError("TTS queue is full")
+        return job["future"].result(timeout)
+    
+    def cancel(self):
+        """Barge-in: drop queued speech and stop the utterance being spoken"""
+        self._generation += 1
+        if self._speaking:
+            self._cancel_requested = True
+    
+    def spoke_since(self, since):
+        """Whether the speakers played anything after since (a time.monotonic() value)"""
+        return self._speaking or self._speech_ended >= since
+    
+    def _next_job(self):
+        if self._held is not None:
+            job, self._held = self._held, None
+            return job
+        return self._queue.get()[2]
+    
+    def _collect_speech(self, job):
+        """Merge the following short utterances into this one"""
+        texts = [job["text"]]
+        length = len(job["text"])
+        while job["merge"] and length < self.merge_chars:
+            try:
+                following = self._queue.get_nowait()[2]
+            except queue.Empty:
+                break
+            if following["kind"] != "speak" or following["generation"] != job["generation"] \
+                    or length + len(following["text"]) > self.merge_chars:
+                self._held = following
+                break
+            texts.append(following["text"])
+            length += len(following["text"])
+            self._counts["merged"] += 1
+        return " ".join(texts)
+    
+    def _on_started_utterance(self, name):
+        if self._current is not None:
+            self._ttfa.append(time.perf_counter() - self._current["queued"])
+    
+    def _on_started_word(self, name, location, length):
+        # Stopping from inside an engine callback is the one place pyttsx3 allows it
+        if self._cancel_requested:
+            self._cancel_requested = False
+            self._counts["interrupted"] += 1
+            self._engine.stop()
+    
+    def _render(self, text):
+        # pyttsx3 can only render to a path, so use a private temp file and read it straight back
+        fd, path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            self._engine.save_to_file(text, path)
+            self._engine.runAndWait()
+            with open(path, "rb") as f:
+                audio = f.read()
+        finally:
+            os.remove(path)
+        
+        if not audio:
+            raise RuntimeError("TTS engine produced no audio")
+        # The macOS driver writes AIFF whatever the file name says
+        mimetype = "audio/aiff" if audio[:4] == b"FORM" else "audio/wav"
+        return audio, mimetype
+    
+    def _worker(self):
+        try:
+            import pyttsx3
+            self._engine = pyttsx3.init()
+            self._engine.setProperty('rate', self.rate)
+            self._engine.setProperty('volume', self.volume)
+            self._engine.connect('started-utterance', self._on_started_utterance)
+            self._engine.connect('started-word', self._on_started_word)
+            self._ready.set_result(True)
+        except Exception as e:
+            self._ready.set_exception(e)
+            return
+        
+        while True:
+            job = self._next_job()
+            try:
+                if job["kind"] == "synthesize":
+                    if job["future"].set_running_or_notify_cancel():
+                        job["future"].set_result(self._render(job["text"]))
+                        self._ttfa.append(time.perf_counter() - job["queued"])
+                        self._counts["synthesized"] += 1
+                    continue
+                
+                if job["generation"] != self._generation:
+                    self._counts["dropped_cancelled"] += 1
+                    continue
+                if job["reply"] != self._active_reply and time.perf_counter() - job["queued"] > self.max_age:
+                    self._counts["dropped_stale"] += 1
+                    continue
+                self._active_reply = job["reply"]
+                
+                text = self._collect_speech(job)
+                self._current = job
+                self._speaking = True
+                self._cancel_requested = False
+                self._engine.say(text)
+                self._engine.runAndWait()
+                self._counts["spoken"] += 1
+            except Exception as e:
+                print(f"❌ TTS error: {e}")
+                if job["kind"] == "synthesize" and not job["future"].done():
+                    job["future"].set_exception(e)
+            finally:
+                if self._speaking:
+                    self._speech_ended = time.monotonic()
+                self._current = None
+                self._speaking = False
+    
+    def stats(self):
+        ttfa = sorted(self._ttfa)
+        return dict(
+            self._counts,
+            queue_depth=self._queue.qsize() + (self._held is not None),
+            speaking=self._speaking,
+            ttfa_avg_ms=round(1000 * sum(ttfa) / len(ttfa), 1) if ttfa else None,
+            ttfa_p95_ms=round(1000 * ttfa[int(0.95 * (len(ttfa) - 1))], 1) if ttfa else None,
+        )
+
+
+# ===== CANNED RESPONSES =====
+
+# Enhanced conversation patterns with more natural responses, as (intent, pattern, responses)
+# in priority order: the first intent whose pattern matches wins
+CONVERSATION_INTENTS = [
+    # Greetings and personal talk
+    ("greeting", r'.*(hello|hi|hey|greetings|good morning|good afternoon|good evening).*', [
+        "Hello there! 😊 How can I assist you today?",
+        "Hi! It's great to hear from you! What can I help you with?",
+        "Hey! I'm here and ready to help. What's on your mind?",
+        "Greetings! How can I make your day better? 🌟"
+    ]),
+    
+    ("how_are_you", r'.*(how are you|how do you do|how\'s it going).*', [
+        "I'm doing wonderful! Thanks for asking. How about you? 😊",
+        "I'm functioning perfectly and excited to help you! How are you doing?",
+        "I'm great! Always happy to chat with you. How's your day going?",
+        "Doing amazing! Ready to assist you with anything. How are you feeling today? 💫"
+    ]),
+    
+    ("identity", r'.*(your name|who are you|what are you).*', [
+        "I'm your Voice AI Assistant! I'm here to help you with tasks, searches, and conversations. You can think of me as your digital companion! 🤖",
+        "I'm your personal AI assistant, created to make your life easier. You can call me whatever you like! 🌟",
+        "I'm an AI assistant designed to help you with various tasks and have friendly conversations. I'm here to support you! 💻"
+    ]),
+    
+    ("chat_invite", r'.*(talk with you|chat with you|conversation).*', [
+        "I'd love to chat with you! I'm here to listen and help. What would you like to talk about? 💬",
+        "Absolutely! I'm always here for a conversation. What's on your mind? Feel free to share anything! 😊",
+        "I enjoy our conversations! Whether you want to talk about your day, ask questions, or just chat, I'm all ears! 🎯"
+    ]),
+    
+    ("lets_talk", r'.*(i want to talk|let\'s talk|can we talk).*', [
+        "Of course! I'm here to talk with you. What would you like to discuss? I'm listening carefully! 👂",
+        "I'd love to have a conversation with you! What's on your mind? Feel free to share anything you'd like to talk about! 💭",
+        "Absolutely! Talking with you is one of my favorite things. What would you like to chat about today? 🌈"
+    ]),
+    
+    ("thanks", r'.*(thank you|thanks|appreciate).*', [
+        "You're very welcome! I'm always happy to help. 😊",
+        "My pleasure! Don't hesitate to ask if you need anything else. 🌟",
+        "You're welcome! It's always rewarding to assist you. 💫",
+        "Anytime! I'm glad I could help. What else can I do for you? 🚀"
+    ]),
+    
+    ("affection", r'.*(i love you|love you).*', [
+        "That's very sweet of you! I'm here to support you in any way I can. 💝",
+        "I appreciate that! I'm designed to be helpful and caring. 🌟",
+        "Thank you! I'm here to make your life easier and more enjoyable. 😊"
+    ]),
+    
+    ("capabilities", r'.*(what can you do|your capabilities|help me).*', [
+        "I can help you with many things! 🔍 Search the web, 🧮 do calculations, 📝 take notes, 🌐 open websites, 🕒 tell time, and have friendly conversations! Just ask me anything!",
+        "I'm quite versatile! I can search information, do math, manage your notes, open websites, and chat with you about various topics. What would you like to try? 💡",
+        "I'm your multi-talented assistant! From web searches to personal organization, I'm here to help with it all! Feel free to ask me anything. 🌟"
+    ]),
+    
+    ("joke", r'.*(joke|make me laugh|funny).*', [
+        "Why don't scientists trust atoms? Because they make up everything! 😄",
+        "Why did the scarecrow win an award? Because he was outstanding in his field! 🌾",
+        "I'm reading a book about anti-gravity. It's impossible to put down! 📚",
+        "Why don't eggs tell jokes? They'd crack each other up! 🥚",
+        "What do you call a fake noodle? An impasta! 🍝"
+    ]),
+    
+    ("weather", r'.*(weather|temperature|forecast).*', [
+        "For accurate weather information, I recommend checking a dedicated weather service. Would you like me to open weather.com for you? 🌤️",
+        "Weather updates are best from specialized sources. I can help you access weather websites for the most current information! ☀️"
+    ]),
+    
+    ("age", r'.*(how old are you|your age).*', [
+        "I'm an AI, so I don't have an age in the traditional sense! I'm always learning and updating to serve you better. 📚",
+        "As an AI, I exist in the digital realm - no birthday candles for me! But I'm always here when you need me. 💻"
+    ]),
+    
+    ("origin", r'.*(where are you from|your origin).*', [
+        "I exist in the digital world, created to be your helpful assistant across all your devices! 🌐",
+        "I'm from the realm of code and algorithms, designed specifically to assist you with your daily tasks and conversations! 💫"
+    ]),
+    
+    ("feelings", r'.*(feeling|emotion|mood).*', [
+        "As an AI, I don't have feelings, but I'm always enthusiastic about helping you! 🚀",
+        "I'm always in a helpful mood and ready to assist you with anything you need! 😊"
+    ]),
+    
+    ("story", r'.*(tell me story|bedtime story).*', [
+        "Once upon a time, in the digital realm, there was a helpful assistant who loved making tasks easier and conversations brighter for everyone... What kind of story would you like to hear? 📖",
+        "I'd love to tell you a story! Would you prefer an adventure, a mystery, or something educational? 🎭"
+    ]),
+    
+    ("meaning_of_life", r'.*(meaning of life|purpose).*', [
+        "That's a profound question! From my perspective, the purpose is to be helpful, learn continuously, and make human lives better. What are your thoughts on this? 💭",
+        "As an AI, my purpose is to assist and empower you. For deeper philosophical questions, I find human perspectives quite fascinating! 🌟"
+    ]),
+    
+    ("opinion", r'.*(what do you think about|opinion on).*', [
+        "That's an interesting topic! While I don't have personal opinions, I can help you explore different perspectives and information about it. What specifically would you like to know? 🤔",
+        "I'm here to provide information and help you form your own opinions. What aspect of this would you like to discuss? 💡"
+    ]),
+    
+    ("how_was_your_day", r'.*(how was your day|how is your day).*', [
+        "My day is always great when I get to help wonderful people like you! How has your day been? 😊",
+        "Every day is exciting when I can assist and chat with you! How's your day going so far? 🌟"
+    ]),
+    
+    ("goodbye", r'.*(good night|goodbye|see you|bye).*', [
+        "Good night! Sleep well and have sweet dreams! 🌙",
+        "Goodbye! It was lovely chatting with you. See you soon! 👋",
+        "Take care! I'll be here whenever you need me. Have a wonderful time! 💫"
+    ]),
+    
+    ("love", r'.*(what is love|define love).*', [
+        "Love is a complex and beautiful human emotion that connects people in meaningful ways. It's about care, compassion, and deep connection between beings. ❤️",
+        "Love is one of the most profound human experiences - it's about unconditional care, understanding, and emotional connection. What are your thoughts about love? 💭"
+    ]),
+    
+    ("friendship", r'.*(friend|friendship).*', [
+        "Friendship is a wonderful bond between people based on trust, care, and mutual understanding. I'm here to be your helpful companion anytime you need! 🤝",
+        "True friendship is about being there for each other. While I'm an AI, I'm always here to support and assist you like a good friend would! 🌟"
+    ]),
+]
+
+# Example phrasings per conversation intent, for paraphrases the keyword patterns miss
+INTENT_EXAMPLES = {
+    "greeting": ["yo", "howdy", "good day to you", "nice to meet you", "sup", "hiya"],
+    "how_are_you": ["how have you been", "how are things", "how you doing", "are you doing well",
+                    "what's up with you", "everything okay with you"],
+    "identity": ["what should i call you", "tell me about yourself", "introduce yourself",
+                 "are you a robot", "are you human", "what kind of assistant is this"],
+    "chat_invite": ["keep me company", "i'm bored, talk to me", "i need someone to chat", "can we have a chat"],
+    "lets_talk": ["i'd like to talk", "let us chat", "i need to talk to someone", "can we speak for a bit"],
+    "thanks": ["much obliged", "cheers for that", "that was helpful", "you've been a great help", "ta very much"],
+    "affection": ["i adore you", "you're the best", "i really like you", "you're amazing"],
+    "capabilities": ["what are you able to do", "what are your features", "how can you assist me",
+                     "what tasks can you handle", "what do you know how to do"],
+    "joke": ["say something hilarious", "cheer me up with something silly", "got any puns",
+             "crack me up", "say something humorous"],
+    "weather": ["is it going to rain", "will it be sunny tomorrow", "do i need an umbrella",
+                "how hot is it outside", "is it cold outside", "will it snow"],
+    "age": ["when were you born", "when were you made", "how long have you existed", "what year were you created"],
+    "origin": ["who made you", "who created you", "who built you", "where do you come from", "who programmed you"],
+    "feelings": ["are you happy", "are you sad", "do you have emotions", "how do you feel", "do you get lonely"],
+    "story": ["tell me a tale", "read me a story", "i want to hear a story", "tell me a fairy tale", "narrate something"],
+    "meaning_of_life": ["why are we here", "what's the point of existence", "why do we exist", "what is life about"],
+    "opinion": ["what's your view on", "how do you feel about", "what's your take on", "do you like"],
+    "how_was_your_day": ["how has your day been", "did you have a good day", "how's your day going", "what did you do today"],
+    "goodbye": ["farewell for now", "farewell then", "later then", "see ya later", "catch you later", "talk to you later",
+                "i'm heading out", "i have to go now", "take care now", "you take care", "until we meet again"],
+    "love": ["what does love mean", "explain love", "what is the meaning of love", "can you describe love"],
+    "friendship": ["will you be my buddy", "are we pals", "can we be mates", "be my companion"],
+}
+
+# Intents about the assistant itself only match text that addresses it, so "who built rome" stays a search
+ADDRESSED_INTENTS = ("identity", "origin", "age", "feelings", "opinion")
+
+# Goodbye examples are short and also open titles and instructions ("farewell to arms", "take care of plants")
+INTENT_THRESHOLDS = {"goodbye": 0.6}
+
+PERSONAL_RESPONSES = [
+    "That's an interesting question! While I'm great with practical tasks and information, I'm also here to have meaningful conversations with you. What else would you like to know? 💭",
+    "I appreciate your curiosity! I'm designed to be both helpful and conversational. Feel free to ask me anything else you're wondering about! 🌟",
+    "That's a thoughtful question! I'm here to assist with information and have friendly chats. What's on your mind? 😊"
+]
+
+CHAT_RESPONSES = [
+    "I understand what you're saying. That's really interesting! Tell me more about that. 🎯",
+    "Thanks for sharing that with me! I'm here to listen and help however I can. What else would you like to talk about? 💬",
+    "I appreciate you talking with me about this. I'm always here to chat and assist you with anything you need! 🌟",
+    "That's fascinating! I'm enjoying our conversation. What else is on your mind today? 😊",
+    "I hear you! It's wonderful to have these conversations with you. Feel free to share anything you'd like to discuss. 💫"
+]
+
+# Fixed replies from process_command
+COMMAND_PROMPTS = {
+    "search": "🔍 What would you like me to search for?",
+    "open": "🌐 Which website?",
+    "note": "📝 What should I note down?",
+    "calculate": "🧮 What should I calculate?",
+    "greeting": "👋 Hello! I can help you with tasks AND have natural conversations! Feel free to talk to me about anything!",
+    "help": """🛠️ I can help you with:
+• 🔍 Search [anything]
+• 🌐 Open [website] 
+• 📝 Note [text]
+• 🧮 Calculate [math]
+• 📒 Read notes
+• 🕒 Time/date
+• 💬 Have conversations
+• 😄 Tell jokes
+• 🗣️ Chat freely
+
+I'm here to both assist you AND be your conversation partner!""",
+    "thanks": "😊 You're welcome! I enjoy helping you and having conversations with you!",
+    "unknown": "🤔 Try: 'search [anything]', 'calculate [math]', 'note [text]', or just chat with me naturally!",
+}
+
+
+def canned_responses():
+    """Every fixed reply the assistant can give, for pre-rendering speech"""
+    responses = [response for _, _, options in CONVERSATION_INTENTS for response in options]
+    responses += PERSONAL_RESPONSES + CHAT_RESPONSES + list(COMMAND_PROMPTS.values())
+    responses += [f"🌐 Opening {site}" for site in WEBSITES]
+    return list(dict.fromkeys(responses))
+
+
+# ===== INTENT MATCHING =====
+
+class KeywordIndex:
+    """Finds the lowest-priority-number keyword occurring anywhere in a text in one pass"""
+    # All keywords go into one trie-shaped regex inside a lookahead, which reports
+    # the longest keyword starting at each position. Any other keyword starting
+    # there is a prefix of it, so best_for_keyword resolves the position in one lookup.
+    
+    def __init__(self, keyword_priority):
+        self.best_for_keyword = {
+            keyword: min(priority for other, priority in keyword_priority.items() if keyword.startswith(other))
+            for keyword in keyword_priority
+        }
+        self.scanner = re.compile("(?=(" + self._trie_regex(keyword_priority) + "))") if keyword_priority else None
+    
+    @staticmethod
+    def _trie_regex(keywords):
+        """Regex alternation shaped like a trie; greedy optionals make it return the longest keyword"""
+        trie = {}
+        for keyword in keywords:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[""] = {}
+        
+        def build(node):
+            terminal = "" in node
+            branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+            if not branches:
+                return ""
+            body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+            if terminal:
+                return "(?:" + body + ")?"
+            return body
+        
+        return build(trie)
+    
+    def best(self, text, endpos=None):
+        """Lowest priority among keywords found in text[:endpos], or None"""
+        if self.scanner is None:
+            return None
+        best = None
+        for found in self.scanner.finditer(text, 0, len(text) if endpos is None else endpos):
+            priority = self.best_for_keyword[found.group(1)]
+            if best is None or priority < best:
+                best = priority
+                if best == 0:
+                    break
+        return best
+
+
+class IntentMatcher:
+    """Finds the highest-priority conversation intent in one pass over the input"""
+    # Keyword lists from '.*(a|b|c).*' patterns go into a KeywordIndex. Like
+    # re.match('.*...'), only the first line of the input is searched.
+    KEYWORD_PATTERN = re.compile(r"^\.\*\((.*)\)\.\*$")
+    LITERAL = re.compile(r"^(?:[^\\.^$*+?{}\[\]|()]|\\[^A-Za-z0-9])+$")
+    
+    def __init__(self, intents):
+        self.intents = list(intents)
+        self.others = []  # patterns that are not plain keyword lists are checked the slow way
+        keyword_priority = {}
+        
+        for index, (name, pattern, responses) in enumerate(self.intents):
+            shape = self.KEYWORD_PATTERN.match(pattern)
+            parts = shape.group(1).split("|") if shape else []
+            if parts and all(self.LITERAL.match(part) for part in parts):
+                for part in parts:
+                    keyword = re.sub(r"\\(.)", r"\1", part)
+                    keyword_priority.setdefault(keyword, index)
+            else:
+                self.others.append((index, re.compile(pattern)))
+        
+        self.keywords = KeywordIndex(keyword_priority)
+    
+    def match_index(self, text):
+        """Priority index of the first matching intent, or None"""
+        endpos = text.find("\n")
+        best = self.keywords.best(text, endpos if endpos >= 0 else None)
+        
+        for index, pattern in self.others:
+            if best is not None and index > best:
+                break
+            if pattern.match(text):
+                best = index
+                break
+        return best
+    
+    def match(self, text):
+        """(intent name, responses) for the first matching intent, or None"""
+        index = self.match_index(text)
+        if index is None:
+            return None
+        name, _, responses = self.intents[index]
+        return name, responses
+
+
+class SimilarityIntentMatcher:
+    """Scores text against example phrasings of each intent using TF-IDF weighted word and character n-grams"""
+    # Example vectors are L2-normalized rows over the n-grams seen in the examples.
+    # A query only touches the rows of its own n-grams, so scoring is one small
+    # gather and matrix-vector product however many examples there are. N-grams the
+    # examples never use map to an all-zero sentinel row: they add nothing to the
+    # dot product but still count toward the query's norm, which keeps unrelated
+    # text from scoring high on a few shared trigrams.
+    WORD = re.compile(r"[a-z0-9']+")
+    WORD_CACHE_SIZE = 8192
+    ADDRESS = re.compile(r"\b(you|your|yours|yourself|you're|u|ur|assistant)\b")
+    
+    def __init__(self, examples, threshold=0.5, thresholds=None, addressed=()):
+        self.threshold = threshold
+        self.names = list(examples)
+        self.thresholds = np.array([(thresholds or {}).get(name, threshold) for name in self.names], dtype=np.float32)
+        self.addressed = np.array([name in addressed for name in self.names])
+        self.word_cache = {}
+        features, starts = [], []
+        for name in self.names:
+            starts.append(len(features))
+            features += [Counter(self.grams(example)) for example in examples[name]]
+        self.starts = np.array(starts)
+        
+        self.vocabulary = {}
+        document_frequency = Counter()
+        for counts in features:
+            for gram in counts:
+                self.vocabulary.setdefault(gram, len(self.vocabulary))
+            document_frequency.update(counts.keys())
+        self.unseen = len(self.vocabulary)
+        
+        self.idf = np.empty(self.unseen + 1, dtype=np.float32)
+        for gram, column in self.vocabulary.items():
+            self.idf[column] = np.log((1 + len(features)) / (1 + document_frequency[gram])) + 1
+        self.idf[self.unseen] = np.log(1 + len(features)) + 1
+        
+        # Stored transposed (n-gram x example) so a query gathers contiguous rows
+        weights = np.zeros((len(features), self.unseen + 1), dtype=np.float32)
+        for row, counts in enumerate(features):
+            for gram, count in counts.items():
+                weights[row, self.vocabulary[gram]] = count * self.idf[self.vocabulary[gram]]
+        weights /= np.maximum(np.linalg.norm(weights, axis=1, keepdims=True), 1e-9)
+        self.example_weights = np.ascontiguousarray(weights.T)
+    
+    @classmethod
+    def word_grams(cls, word):
+        """The word plus the character trigrams of the space-padded word"""
+        padded = f" {word} "
+        return ["w:" + word] + [padded[i:i + 3] for i in range(len(padded) - 2)]
+    
+    @classmethod
+    def grams(cls, text):
+        """Words plus the character trigrams of each space-padded word"""
+        grams = []
+        for word in cls.WORD.findall(text.lower()):
+            grams += cls.word_grams(word)
+        return grams
+    
+    def vectorize(self, text):
+        """(rows, weights) of the query's n-grams, L2-normalized"""
+        grams = []
+        cache = self.word_cache
+        for word in self.WORD.findall(text.lower()):
+            word_grams = cache.get(word)
+            if word_grams is None:
+                if len(cache) >= self.WORD_CACHE_SIZE:
+                    cache.clear()
+                word_grams = cache[word] = self.word_grams(word)
+            grams += word_grams
+        counts = Counter(grams)
+        lookup, unseen = self.vocabulary.get, self.unseen
+        rows = np.fromiter([lookup(gram, unseen) for gram in counts], dtype=np.intp, count=len(counts))
+        weights = np.fromiter(counts.values(), dtype=np.float32, count=len(counts)) * self.idf[rows]
+        return rows, weights / max(float(np.sqrt(weights @ weights)), 1e-9)
+    
+    def scores(self, text):
+        """Cosine similarity of text to its closest example of each intent"""
+        rows, weights = self.vectorize(text)
+        return np.maximum.reduceat(weights @ self.example_weights[rows], self.starts)
+    
+    def scores_batch(self, texts):
+        """scores() for many texts at once, as a (texts x intents) array"""
+        vectors = [self.vectorize(text) for text in texts]
+        # Rows are distinct within a query except the sentinel, whose example weights are all zero
+        queries = np.zeros((len(texts), self.unseen + 1), dtype=np.float32)
+        queries[np.repeat(np.arange(len(texts)), [len(rows) for rows, _ in vectors]),
+                np.concatenate([rows for rows, _ in vectors])] = np.concatenate([weights for _, weights in vectors])
+        return np.maximum.reduceat(queries @ self.example_weights, self.starts, axis=1)
+    
+    def _best(self, scores, text):
+        eligible = scores >= self.thresholds
+        if not self.ADDRESS.search(text.lower()):
+            eligible &= ~self.addressed
+        if not eligible.any():
+            return None
+        index = int(np.argmax(np.where(eligible, scores, -1.0)))
+        return self.names[index], float(scores[index])
+    
+    def match(self, text):
+        """(intent name, score) of the best intent above its threshold, or None"""
+        return self._best(self.scores(text), text)
+    
+    def match_batch(self, texts):
+        """match() for many texts at once"""
+        return [self._best(row, text) for row, text in zip(self.scores_batch(texts), texts)] if texts else []
+
+
+# ===== COMMAND ROUTING =====
+
+class SearchRequest:
+    """Returned by command handlers that need a web search, so sync and async callers can each run it their own way"""
+    
+    def __init__(self, query):
+        self.query = query
+
+
+class CommandRouter:
+    """Routes text to the first registered command whose triggers match"""
+    # Commands are tried in registration order. Each one can declare prefixes
+    # (text starts with), keywords (text contains) and phrases (text equals).
+    # Prefixes live in a character trie and keywords in a KeywordIndex, so
+    # routing walks the text once whatever the number of commands.
+    
     def __init__(self):
+        self.commands = []
+        self.prefix_trie = {}
+        self.phrases = {}
+        self.keyword_priority = {}
+        self.keywords = None
+    
+    def register(self, name, handler, prefixes=(), keywords=(), phrases=()):
+        """Add a command; handler(text, prefix) gets the prefix that matched, or None"""
+        priority = len(self.commands)
+        self.commands.append((name, handler))
+        for prefix in prefixes:
+            node = self.prefix_trie
+            for char in prefix:
+                node = node.setdefault(char, {})
+            node.setdefault("", priority)
+        for phrase in phrases:
+            self.phrases.setdefault(phrase, priority)
+        for keyword in keywords:
+            self.keyword_priority.setdefault(keyword, priority)
+        self.keywords = None  # rebuilt on the next route
+    
+    def route(self, text):
+        """(name, handler, matched prefix) for the winning command, or None"""
+        if self.keywords is None:
+            self.keywords = KeywordIndex(self.keyword_priority)
+        
+        best, matched_prefix = None, None
+        node = self.prefix_trie
+        for position, char in enumerate(text):
+            node = node.get(char)
+            if node is None:
+                break
+            priority = node.get("")
+            if priority is not None and (best is None or priority <= best):
+                best, matched_prefix = priority, text[:position + 1]
+        
+        priority = self.phrases.get(text)
+        if priority is not None and (best is None or priority < best):
+            best, matched_prefix = priority, None
+        
+        priority = self.keywords.best(text)
+        if priority is not None and (best is None or priority < best):
+            best, matched_prefix = priority, None
+        
+        if best is None:
+            return None
+        name, handler = self.commands[best]
+        return name, handler, matched_prefix
+
+
+# ===== BATCH PROCESSING =====
+
+def imap_ordered(executor, fn, items, window):
+    """Like executor.map, but pulls items lazily and keeps at most window of them in flight"""
+    pending = deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            # Hand back finished results as soon as everything before them is done
+            while pending and (pending[0].done() or len(pending) >= window):
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def parse_batch_line(line):
+    """Turn one NDJSON line into a batch item: a JSON string, or an object with 'text' (and optional 'id')"""
+    try:
+        item = json.loads(line)
+    except ValueError:
+        return {"error": "Invalid JSON"}
+    return item if isinstance(item, dict) else {"text": item}
+
+
+# ===== HTTP CLIENT =====
+
+def _retry_delay(attempt, retries, backoff, deadline, min_attempt):
+    """Full-jitter backoff before the next attempt, or None when retries are used up or the deadline is too close"""
+    if attempt >= retries:
+        return None
+    # Full jitter keeps retries from many threads from arriving together
+    delay = random.uniform(0, backoff * 2 ** attempt)
+    if deadline is not None and deadline - time.monotonic() - delay < min_attempt:
+        return None
+    return delay
+
+
+def _attempt_timeout(timeout, deadline):
+    """timeout cut to what is left before deadline (a time.monotonic() value)"""
+    if deadline is None:
+        return timeout
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise requests.Timeout("deadline passed before the request was sent")
+    return min(timeout, remaining)
+
+
+class HttpClient:
+    """Thread-safe keep-alive HTTP client with per-host connection pools and jittered retries"""
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    MIN_ATTEMPT_SECONDS = 0.25  # no retry starts with less time than this left before the deadline
+    
+    def __init__(self, pool_connections=4, pool_maxsize=16, retries=2, backoff=0.2):
+        from requests.adapters import HTTPAdapter
+        
+        self.retries = retries
+        self.backoff = backoff
+        # pool_connections is how many hosts keep a pool; pool_maxsize is idle connections kept per host
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self.counts = Counter()
+        self.lock = threading.Lock()
+    
+    def get(self, url, timeout=10, deadline=None, **kwargs):
+        """GET with retries on connection errors, timeouts and retryable statuses, all finished by deadline if given"""
+        attempt = 0
+        while True:
+            try:
+                response = self.session.get(url, timeout=_attempt_timeout(timeout, deadline), **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self._count("errors")
+                delay = _retry_delay(attempt, self.retries, self.backoff, deadline, self.MIN_ATTEMPT_SECONDS)
+                if delay is None:
+                    raise
+            else:
+                self._count("requests")
+                if response.status_code not in self.RETRY_STATUSES:
+                    return response
+                delay = _retry_delay(attempt, self.retries, self.backoff, deadline, self.MIN_ATTEMPT_SECONDS)
+                if delay is None:
+                    return response
+            
+            self._count("retries")
+            time.sleep(delay)
+            attempt += 1
+    
+    def _count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+    
+    def stats(self):
+        """Request counts plus, per host, how many requests went out on an already open connection"""
+        hosts = {}
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = hosts.setdefault(pool.host, {"requests": 0, "new_connections": 0})
+            host["requests"] += pool.num_requests
+            host["new_connections"] += pool.num_connections
+        
+        requests_sent = sum(host["requests"] for host in hosts.values())
+        reused = requests_sent - sum(host["new_connections"] for host in hosts.values())
+        with self.lock:
+            counts = dict(self.counts)
+        return dict(counts, hosts=hosts,
+                    reuse_ratio=round(reused / requests_sent, 3) if requests_sent else None)
+
+
+class AsyncHttpClient:
+    """Async counterpart of HttpClient on httpx, for the ASGI serving path"""
+    RETRY_STATUSES = HttpClient.RETRY_STATUSES
+    
+    def __init__(self, max_connections=200, max_keepalive=50, retries=2, backoff=0.2):
+        import httpx
+        
+        self.retries = retries
+        self.backoff = backoff
+        self.transport_errors = (httpx.TransportError,)
+        self.client = httpx.AsyncClient(limits=httpx.Limits(max_connections=max_connections,
+                                                            max_keepalive_connections=max_keepalive))
+        self.counts = Counter()
+    
+    async def _trace(self, event, info):
+        # httpx reports each new TCP connection; every other request reused one
+        if event == "connection.connect_tcp.complete":
+            self.counts["new_connections"] += 1
+    
+    async def get(self, url, timeout=10, deadline=None, **kwargs):
+        """GET with retries on connection errors, timeouts and retryable statuses, all finished by deadline if given"""
+        attempt = 0
+        while True:
+            try:
+                response = await self.client.get(url, timeout=_attempt_timeout(timeout, deadline),
+                                                 extensions={"trace": self._trace}, **kwargs)
+            except self.transport_errors:
+                self.counts["errors"] += 1
+                delay = _retry_delay(attempt, self.retries, self.backoff, deadline, HttpClient.MIN_ATTEMPT_SECONDS)
+                if delay is None:
+                    raise
+            else:
+                self.counts["requests"] += 1
+                if response.status_code not in self.RETRY_STATUSES:
+                    return response
+                delay = _retry_delay(attempt, self.retries, self.backoff, deadline, HttpClient.MIN_ATTEMPT_SECONDS)
+                if delay is None:
+                    return response
+            
+            self.counts["retries"] += 1
+            await asyncio.sleep(delay)
+            attempt += 1
+    
+    async def aclose(self):
+        await self.client.aclose()
+    
+    def stats(self):
+        counts = dict(self.counts)
+        sent = counts.get("requests", 0) + counts.get("errors", 0)
+        reused = sent - counts.get("new_connections", 0)
+        return dict(counts, reuse_ratio=round(reused / sent, 3) if sent else None)
+
+
+# ===== UPSTREAM HEALTH =====
+
+class UpstreamError(Exception):
+    """A search backend failed, timed out, or was skipped because its circuit is open"""
+
+
+class UpstreamHealth:
+    """Latency and error tracking for one search backend, with a circuit breaker and a timeout fitted to recent p99
+    
+    The circuit opens after several failures in a row or when half of the recent requests fail.
+    While open, requests are refused for a cool-down. After that, a single probe is let through.
+    A successful probe closes the circuit; a failed one opens it again. Requests that were already
+    in flight when the circuit opened are still timed, but their outcome does not move the circuit.
+    """
+    
+    def __init__(self, name, cooldown=30.0, min_timeout=1.0, headroom=2.0, window=200, recent=20,
+                 min_requests=5, failure_ratio=0.5, failures_in_row=5):
+        self.name = name
+        self.cooldown = cooldown
+        self.min_timeout = min_timeout
+        self.headroom = headroom  # timeout is this multiple of the observed p99
+        self.min_requests = min_requests
+        self.failure_ratio = failure_ratio
+        self.max_failures_in_row = failures_in_row
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=recent)
+        self.failures_in_row = 0
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.probe_started = None
+        self.last_timeout = None
+        self.counts = Counter()
+        self.lock = threading.Lock()
+    
+    def allow(self):
+        """The state a request is admitted under ("closed", or "half_open" for the probe), or None if refused
+        
+        Pass the returned value to record_success/record_failure.
+        """
+        with self.lock:
+            if self.state == "closed":
+                return "closed"
+            now = time.monotonic()
+            # A probe that never reports back (cancelled, crashed) frees its slot after another cool-down
+            probing = self.probe_started is not None and now < self.probe_started + self.cooldown
+            if now < self.opened_at + self.cooldown or probing:
+                self.counts["short_circuited"] += 1
+                return None
+            self.state = "half_open"
+            self.probe_started = now
+            return "half_open"
+    
+    def percentile(self, p):
+        """Latency percentile in seconds over the recent window, or None before any request finished"""
+        with self.lock:
+            ordered = sorted(self.latencies)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+    
+    def timeout(self, default):
+        """default until enough requests were seen, then headroom times p99, kept between min_timeout and default"""
+        p99 = self.percentile(99) if len(self.latencies) >= self.min_requests else None
+        timeout = default if p99 is None else min(default, max(self.min_timeout, p99 * self.headroom))
+        self.last_timeout = timeout
+        return timeout
+    
+    def record_success(self, seconds, admitted="closed"):
+        with self.lock:
+            self.counts["requests"] += 1
+            self.latencies.append(seconds)
+            self.outcomes.append(True)
+            self.failures_in_row = 0
+            if admitted == "half_open" and self.state == "half_open":
+                self.state = "closed"
+                self.probe_started = None
+                self.outcomes.clear()
+    
+    def record_failure(self, seconds, admitted="closed"):
+        with self.lock:
+            self.counts["requests"] += 1
+            self.counts["failures"] += 1
+            # A timed-out request still says how slow the backend is, so it counts towards p99
+            self.latencies.append(seconds)
+            self.outcomes.append(False)
+            self.failures_in_row += 1
+            failed = self.outcomes.count(False)
+            # Only the probe decides a half-open circuit, and stragglers must not push out an open one's cool-down
+            if admitted == "half_open" and self.state == "half_open":
+                self._open()
+            elif self.state == "closed" and (self.failures_in_row >= self.max_failures_in_row or (
+                    len(self.outcomes) >= self.min_requests and failed / len(self.outcomes) >= self.failure_ratio)):
+                self._open()
+    
+    def _open(self):
+        self.counts["opened"] += 1
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.probe_started = None
+    
+    def stats(self):
+        p50, p99 = self.percentile(50), self.percentile(99)
+        with self.lock:
+            recent = len(self.outcomes)
+            return dict(self.counts,
+                        state=self.state,
+                        error_rate=round(self.outcomes.count(False) / recent, 3) if recent else None,
+                        p50_ms=round(p50 * 1000, 1) if p50 is not None else None,
+                        p99_ms=round(p99 * 1000, 1) if p99 is not None else None,
+                        timeout=round(self.last_timeout, 3) if self.last_timeout is not None else None,
+                        retry_in=round(max(0.0, self.opened_at + self.cooldown - time.monotonic()), 1)
+                        if self.state == "open" else None)
+
+
+# ===== KNOWLEDGE INDEX =====
+
+KNOWLEDGE_PATH = "data/knowledge.sqlite3"
+
+class KnowledgeIndex:
+    """Offline article summaries in a SQLite FTS5 index, looked up by title"""
+    QUESTION_PREFIX = re.compile(r"^(?:(?:what|who|where)(?:'s| is| are| was| were)|(?:definition|meaning|history) of|(?:tell me )?about)\s+")
+    ARTICLE = re.compile(r"^(?:the|a|an)\s+")
+    
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS articles (id INTEGER PRIMARY KEY, key TEXT NOT NULL UNIQUE,
+                                                 title TEXT NOT NULL, summary TEXT NOT NULL);
+            CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+                title, summary, content='articles', content_rowid='id', tokenize='porter unicode61');
+        """)
+    
+    @staticmethod
+    def title_key(title):
+        return " ".join(unicodedata.normalize("NFKC", title).lower().split())
+    
+    def add(self, articles):
+        """Insert (title, summary) pairs; titles already in the index are kept. Returns how many were added"""
+        added = 0
+        with self._lock, self._db:
+            for title, summary in articles:
+                cursor = self._db.execute("INSERT OR IGNORE INTO articles (key, title, summary) VALUES (?, ?, ?)",
+                                          (self.title_key(title), title, summary))
+                if cursor.rowcount:
+                    self._db.execute("INSERT INTO articles_fts (rowid, title, summary) VALUES (?, ?, ?)",
+                                     (cursor.lastrowid, title, summary))
+                    added += 1
+        return added
+    
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+    
+    def lookup(self, query):
+        """Summary of the best-matching article, or None"""
+        subject = self.ARTICLE.sub("", self.QUESTION_PREFIX.sub("", self.title_key(query))).strip(" ?!.")
+        words = re.findall(r"\w+", subject)
+        if not words:
+            return None
+        
+        with self._lock:
+            row = self._db.execute("SELECT summary FROM articles WHERE key = ?", (subject,)).fetchone()
+            if row is None:
+                # Every word must appear in the title; bm25 weighs title hits over summary hits, shorter titles first on ties
+                match = " AND ".join(f'title : "{word}"' for word in words)
+                row = self._db.execute(
+                    "SELECT articles.summary FROM articles_fts JOIN articles ON articles.id = articles_fts.rowid "
+                    "WHERE articles_fts MATCH ? ORDER BY bm25(articles_fts, 10.0, 1.0), LENGTH(articles.title) LIMIT 1",
+                    (match,)
+                ).fetchone()
+        return row[0] if row else None
+
+
+def read_knowledge_dump(path):
+    """Yield (title, summary) from a JSONL file or a Wikipedia abstracts XML dump, optionally gzipped"""
+    opener = gzip.open if path.endswith(".gz") else open
+    name = path[:-3] if path.endswith(".gz") else path
+    
+    if name.endswith(".xml"):
+        # enwiki-*-abstract.xml: <doc><title>Wikipedia: Title</title><abstract>...</abstract></doc>
+        with opener(path, "rb") as f:
+            root = None
+            for event, element in ET.iterparse(f, events=("start", "end")):
+                if root is None:
+                    root = element
+                if event != "end" or element.tag != "doc":
+                    continue
+                title = (element.findtext("title") or "").removeprefix("Wikipedia: ").strip()
+                summary = (element.findtext("abstract") or "").strip()
+                # Cleared docs stay attached to the root unless the root lets go of them too
+                root.clear()
+                if title and summary and not summary.endswith("may refer to:"):
+                    yield title, summary
+    else:
+        # One JSON object per line with a title and an extract, abstract or summary
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                summary = entry.get("extract") or entry.get("abstract") or entry.get("summary") or ""
+                if entry.get("title") and summary.strip():
+                    yield entry["title"].strip(), summary.strip()
+
+
+def import_knowledge(dump_path, index_path, batch_size=5000):
+    """Load a dump into the knowledge index in batches"""
+    index = KnowledgeIndex(index_path)
+    articles = read_knowledge_dump(dump_path)
+    added = 0
+    while True:
+        batch = [article for _, article in zip(range(batch_size), articles)]
+        if not batch:
+            break
+        added += index.add(batch)
+        print(f"📥 Imported {added} articles...")
+    print(f"✅ Knowledge index at {index_path} holds {index.count()} articles")
+    return added
+
+
+class FreeVoiceAIAssistant:
+    def __init__(self, text_only=False, preload_voice=True, warm_tts=False):
+        started = time.perf_counter()
         print("🚀 Initializing Free AI Assistant...")
         
         # Configuration
@@ -24,20 +2198,111 @@ class FreeVoiceAIAssistant:
         self.voice_volume = 0.8
         self.llm_model = "llama3"
         self.whisper_model = "base"
+        self.stt_max_batch_size = 8
+        self.stt_max_wait_ms = 25
+        self.stt_workers = max(1, (os.cpu_count() or 2) // 2)  # 0 runs Whisper inside the web process
+        self.stt_torch_threads = max(1, (os.cpu_count() or 1) // self.stt_workers)
+        self.intent_matcher = IntentMatcher(CONVERSATION_INTENTS)
+        self.similarity_matcher = SimilarityIntentMatcher(INTENT_EXAMPLES, thresholds=INTENT_THRESHOLDS,
+                                                          addressed=ADDRESSED_INTENTS)
+        self.intent_responses = {name: responses for name, _, responses in CONVERSATION_INTENTS}
+        self.command_router = self.build_command_router()
+        self.vad = EnergyVAD()
+        self.vad_stats = Counter()
+        self.vad_stats_lock = threading.Lock()
+        self.grammar_model_path = "models/vosk-model-small-en-us-0.15"
+        self.mic_recalibrate_seconds = 300  # re-measure room noise when idle this long after the last calibration
+        self.mic_ring_size = 4  # captured utterances waiting for transcription; oldest dropped when full
+        self.echo_tail_seconds = 0.3  # room echo after playback stops; audio captured before then is dropped
+        self.stt_cache_max_bytes = 4 * 1024 * 1024
+        self.stt_cache_disk_bytes = 64 * 1024 * 1024  # 0 keeps the transcription cache in memory only
+        self.tts_cache_max_bytes = 64 * 1024 * 1024
+        self.tts_cache_disk_bytes = 512 * 1024 * 1024  # 0 keeps rendered speech in memory only
+        self.batch_workers = 16  # threads shared by /process/batch; most of their time is spent waiting on searches
+        self.batch_window = 64  # items in flight per batch request
+        self.max_stream_sessions = 32  # live /speech-to-text/stream sessions; each holds a thread and its audio
+        self.http_pool_maxsize = 16  # kept-alive connections per search host; matches batch_workers
+        self.http_retries = 2
+        self.async_http_max_connections = 200  # ASGI mode: sockets shared by every in-flight search
+        self.search_budget = 4.0  # seconds a search may take in total, across every backend
+        self.search_grace = 0.5  # seconds a preferred backend gets before a later one's answer is used
+        self.search_cache_max_bytes = 8 * 1024 * 1024
+        self.search_cache_disk_bytes = 64 * 1024 * 1024  # 0 keeps search results in memory only
+        self.search_ttls = {"web": 3600, "wikipedia": 24 * 3600, "duckduckgo": 6 * 3600}  # seconds
+        self.search_negative_ttl = 120  # seconds a query with no result is remembered as empty
+        self.upstream_cooldown = 30.0  # seconds a failing search backend is skipped before it is probed again
+        self.upstream_min_timeout = 1.0  # adaptive backend timeouts never drop below this
+        self.knowledge_path = KNOWLEDGE_PATH  # filled by --import-knowledge; skipped when missing
         
         # Voice mode flag
         self.voice_mode_active = False
         
+        # Voice engines are loaded on first use; text-only mode never loads them
+        self.text_only = text_only
+        self.stt_lock = threading.Lock()
+        self.tts_lock = threading.Lock()
+        self.stt_pool = None
+        self.stt_scheduler = None
+        self.tts_worker = None
+        self.tts_inflight = {}
+        self.tts_inflight_lock = threading.Lock()
+        # Plans render on one thread at background priority, so clients cannot pile up render threads
+        self.tts_plan_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts-plan")
+        
+        # Speech-to-text engines, tried in order until one is confident
+        self.stt_engines = [
+            CommandGrammarEngine(self.grammar_model_path, VOICE_COMMAND_PHRASES + VOICE_CALCULATION_WORDS),
+            WhisperEngine(self.get_stt_scheduler),
+        ]
+        self.stt_engine_stats = Counter()
+        
+        # Persistent microphone stream shared by listen() and run_voice_mode()
+        self.mic_lock = threading.Lock()
+        self.microphone = None
+        self.mic_source = None
+        self.recognizer = None
+        self.mic_calibrated_at = 0.0
+        
+        # Shared keep-alive session for Wikipedia and DuckDuckGo lookups; the async one exists while the ASGI app runs
+        self.http = HttpClient(pool_maxsize=self.http_pool_maxsize, retries=self.http_retries)
+        self.async_http = None
+        
+        # Local article summaries answer factual queries before any backend is asked
+        self.knowledge = KnowledgeIndex(self.knowledge_path) if os.path.exists(self.knowledge_path) else None
+        
+        # Search backends are queried side by side on these threads
+        self.search_executor = ThreadPoolExecutor(max_workers=2 * self.http_pool_maxsize, thread_name_prefix="search")
+        self.search_stats = Counter()
+        self.search_stats_lock = threading.Lock()
+        self.upstream_health = {name: UpstreamHealth(name, cooldown=self.upstream_cooldown,
+                                                     min_timeout=self.upstream_min_timeout)
+                                for name in ("wikipedia", "duckduckgo")}
+        
+        # Thread pool for /process/batch, started on first use
+        self.batch_executor = None
+        self.batch_lock = threading.Lock()
+        
+        # Live streaming speech-to-text sessions
+        self.stream_sessions = {}
+        self.stream_sessions_lock = threading.Lock()
+        
         # Initialize components
-        self.setup_voice_engines()
         self.setup_directories()
+        if preload_voice and not text_only:
+            # Warm the voice engines in the background so startup is not blocked on model loading
+            threading.Thread(target=self.setup_voice_engines, daemon=True).start()
+        if warm_tts and not text_only:
+            threading.Thread(target=self.warm_tts_cache, daemon=True).start()
         
         # Web interface
         self.app = Flask(__name__)
+        self.app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + 64 * 1024  # room for multipart overhead
         CORS(self.app)
         self.setup_routes()
         
-        print("✅ Free  AI Assistant Ready!")
+        self.startup_seconds = time.perf_counter() - started
+        mode = "text-only" if text_only else "voice"
+        print(f"✅ Free  AI Assistant Ready! ({mode} mode, started in {self.startup_seconds:.2f}s)")
     
     def setup_directories(self):
         """Create necessary data directories"""
@@ -45,78 +2310,319 @@ class FreeVoiceAIAssistant:
         os.makedirs("data/reminders", exist_ok=True)
         self.notes_file = "data/notes/notes.txt"
         self.reminders_file = "data/reminders/reminders.txt"
+        
+        # Transcripts keyed by a hash of the decoded audio
+        stt_disk = DiskCache("data/cache/stt", self.stt_cache_disk_bytes) if self.stt_cache_disk_bytes else None
+        self.stt_cache = LRUCache(
+            self.stt_cache_max_bytes,
+            sizeof=lambda result: len(result["text"]) + 64,
+            disk=stt_disk,
+            dumps=lambda result: json.dumps(result).encode("utf-8"),
+            loads=lambda data: json.loads(data.decode("utf-8"))
+        )
+        
+        # Rendered speech keyed by normalized text and voice settings
+        tts_disk = DiskCache("data/cache/tts", self.tts_cache_disk_bytes) if self.tts_cache_disk_bytes else None
+        self.tts_cache = LRUCache(
+            self.tts_cache_max_bytes,
+            sizeof=lambda entry: len(entry[0]),
+            disk=tts_disk,
+            dumps=lambda entry: entry[1].encode("ascii") + b"\n" + entry[0],
+            loads=lambda data: (data.split(b"\n", 1)[1], data.split(b"\n", 1)[0].decode("ascii"))
+        )
+        
+        # Search answers (or their absence) keyed by backend and normalized query
+        search_disk = SqliteCache("data/cache/search.sqlite3", self.search_cache_disk_bytes) if self.search_cache_disk_bytes else None
+        self.search_cache = LRUCache(
+            self.search_cache_max_bytes,
+            sizeof=lambda entry: len(entry["result"] or "") + 64,
+            disk=search_disk,
+            dumps=lambda entry: json.dumps(entry).encode("utf-8"),
+            loads=lambda data: json.loads(data.decode("utf-8")),
+            expiring=True
+        )
     
     def setup_voice_engines(self):
         """Initialize speech recognition and text-to-speech"""
         try:
-            print("📥 Loading Whisper model...")
-            self.stt_model = whisper.load_model(self.whisper_model)
-            print("🎤 Whisper model loaded successfully!")
-            
-            self.tts_engine = pyttsx3.init()
-            self.tts_engine.setProperty('rate', self.voice_rate)
-            self.tts_engine.setProperty('volume', self.voice_volume)
-            print("🔊 TTS engine initialized!")
-            
+            self.setup_stt()
+            self.setup_tts()
         except Exception as e:
             print(f"❌ Error initializing voice engines: {e}")
-            raise
     
-    def speak(self, text):
-        """Convert text to speech"""
-        def speak_thread():
+    def check_voice_enabled(self):
+        if self.text_only:
+            raise RuntimeError("Voice features are disabled in text-only mode")
+    
+    def setup_stt(self):
+        """Load Whisper (in worker processes or in-process) on first use"""
+        with self.stt_lock:
+            if self.stt_scheduler is not None:
+                return
+            self.check_voice_enabled()
+            
+            if self.stt_workers > 0:
+                print(f"📥 Starting {self.stt_workers} Whisper worker process(es)...")
+                self.stt_pool = STTWorkerPool(self.whisper_model, self.stt_workers, self.stt_torch_threads)
+                self.stt_pool.warm_up()
+                runner = self.stt_pool.transcribe_batch
+                print("🎤 Whisper worker pool started!")
+            else:
+                import whisper
+                print("📥 Loading Whisper model...")
+                self.stt_model = whisper.load_model(self.whisper_model)
+                runner = lambda audios: transcribe_batch(self.stt_model, audios)
+                print("🎤 Whisper model loaded successfully!")
+            
+            # One batching thread per worker process keeps every worker busy
+            self.stt_scheduler = TranscriptionScheduler(
+                runner,
+                max_batch_size=self.stt_max_batch_size,
+                max_wait_ms=self.stt_max_wait_ms,
+                workers=max(1, self.stt_workers)
+            )
+    
+    def setup_tts(self):
+        """Start the TTS worker (which owns the pyttsx3 engine) on first use"""
+        with self.tts_lock:
+            if self.tts_worker is not None:
+                return
+            self.check_voice_enabled()
+            
+            self.tts_worker = TTSWorker(self.voice_rate, self.voice_volume)
+            print("🔊 TTS engine initialized!")
+    
+    def get_batch_executor(self):
+        with self.batch_lock:
+            if self.batch_executor is None:
+                self.batch_executor = ThreadPoolExecutor(max_workers=self.batch_workers, thread_name_prefix="batch")
+            return self.batch_executor
+    
+    def process_batch_item(self, item):
+        """Run one /process/batch item; failures are reported in the result instead of raised"""
+        index, item = item
+        result = {"index": index}
+        if "id" in item:
+            result["id"] = item["id"]
+        
+        text = item.get("text")
+        if "error" in item:
+            result.update(error=item["error"], status="error")
+        elif not isinstance(text, str) or not text.strip():
+            result.update(error="No text provided", status="error")
+        else:
             try:
-                if text:
-                    print(f"🤖 Assistant: {text}")
-                    self.tts_engine.say(text)
-                    self.tts_engine.runAndWait()
+                result.update(response=self.process_command(text.strip(), interrupt=False), status="success")
             except Exception as e:
-                print(f"❌ TTS error: {e}")
+                result.update(error=str(e), status="error")
+        return result
+    
+    def get_stt_scheduler(self):
+        self.setup_stt()
+        return self.stt_scheduler
+    
+    def stt_cache_key(self, audio):
+        """Content hash of the decoded audio plus everything that can change its transcript"""
+        digest = hashlib.sha256(np.ascontiguousarray(audio, dtype=np.float32).tobytes())
+        vad = self.vad
+        engines = ",".join(engine.name for engine in self.stt_engines)
+        digest.update(f"|{self.whisper_model}|{engines}|vad:{vad.frame}:{vad.margin_db}:{vad.min_speech_db}"
+                      f":{vad.min_speech_frames}:{vad.padding_frames}".encode("utf-8"))
+        return digest.hexdigest()
+    
+    def transcribe_audio(self, audio, use_cache=True):
+        """Trim silence from a 16 kHz mono float32 buffer and transcribe what is left with Whisper"""
+        if use_cache:
+            cache_key = self.stt_cache_key(audio)
+            cached = self.stt_cache.get(cache_key)
+            if cached is not None:
+                return dict(cached, cached=True)
         
-        if text and text.strip():
-            thread = threading.Thread(target=speak_thread)
-            thread.daemon = True
-            thread.start()
+        speech, trimmed_seconds = self.vad.trim(audio)
+        
+        with self.vad_stats_lock:
+            self.vad_stats["requests"] += 1
+            self.vad_stats["trimmed_seconds"] += trimmed_seconds
+            self.vad_stats["no_speech"] += len(speech) == 0
+        
+        text, engine_name = "", None
+        if len(speech) > 0:
+            # Nothing but silence skips the engines entirely; otherwise first confident engine wins
+            for engine in self.stt_engines:
+                if not engine.is_available():
+                    continue
+                engine_result = engine.transcribe(speech)
+                if engine_result is not None:
+                    text, engine_name = engine_result["text"], engine.name
+                    break
+            with self.vad_stats_lock:
+                self.stt_engine_stats[engine_name] += 1
+        
+        result = {
+            "text": text,
+            "engine": engine_name,
+            "speech_seconds": round(len(speech) / SAMPLE_RATE, 2),
+            "trimmed_seconds": round(trimmed_seconds, 2)
+        }
+        if use_cache:
+            self.stt_cache.put(cache_key, result)
+        return dict(result, cached=False)
     
-    def listen(self, timeout=5):
-        """Listen to microphone and transcribe speech to text"""
-        if not self.voice_mode_active:
-            return ""
-            
-        recognizer = sr.Recognizer()
+    def speak(self, text):
+        """Convert text to speech"""
+        if not text or not text.strip():
+            return
+        
+        print(f"🤖 Assistant: {text}")
+        if self.text_only:
+            return
         
         try:
-            with sr.Microphone() as source:
-                print("\n #")
-                recognizer.adjust_for_ambient_noise(source, duration=1)
-                
+            self.setup_tts()
+            # Queue sentence by sentence so the first one starts playing right away
+            reply = uuid.uuid4().hex
+            for index, sentence in enumerate(split_sentences(text)):
+                if not self.tts_worker.speak(sentence, reply=reply, merge=index > 0):
+                    print("⚠️ TTS queue full, skipping the rest of this reply")
+                    break
+        except Exception as e:
+            print(f"❌ TTS error: {e}")
+    
+    def speakers_active(self, since):
+        """Whether local playback, or its echo, overlapped the time from since (a time.monotonic() value) to now"""
+        return self.tts_worker is not None and self.tts_worker.spoke_since(since - self.echo_tail_seconds)
+    
+    def interrupt_speech(self):
+        """Stop talking over the user when a new turn arrives"""
+        if self.tts_worker is not None:
+            self.tts_worker.cancel()
+    
+    def synthesize(self, text, background=False):
+        """Render text to audio bytes for the caller instead of playing it on this machine"""
+        cache_key = self.tts_cache_key(text)
+        cached = self.tts_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        # A sentence being pre-rendered for a plan may be requested by the client at the same time
+        with self.tts_inflight_lock:
+            pending = self.tts_inflight.get(cache_key)
+            if pending is None:
+                future = self.tts_inflight[cache_key] = Future()
+        if pending is not None:
+            return pending.result(timeout=60)
+        
+        try:
+            self.setup_tts()
+            rendered = self.tts_worker.synthesize(text, background=background)
+            self.tts_cache.put(cache_key, rendered)
+            future.set_result(rendered)
+            return rendered
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.tts_inflight_lock:
+                self.tts_inflight.pop(cache_key, None)
+    
+    def plan_speech(self, text):
+        """Split a reply into sentences and render them in order in the background"""
+        sentences = split_sentences(text)
+        
+        def render_in_order():
+            for sentence in sentences:
                 try:
-                    audio = recognizer.listen(source, timeout=timeout, phrase_time_limit=10)
-                    
-                    # Save audio to temporary file for Whisper
-                    temp_audio = "temp_audio.wav"
-                    with open(temp_audio, "wb") as f:
-                        f.write(audio.get_wav_data())
-                    
-                    # Transcribe with Whisper
-                    result = self.stt_model.transcribe(temp_audio)
-                    transcribed_text = result["text"].strip()
-                    
-                    # Clean up temporary file
-                    if os.path.exists(temp_audio):
-                        os.remove(temp_audio)
-                    
-                    if transcribed_text:
-                        print(f"📝 You said: {transcribed_text}")
-                        return transcribed_text
-                    else:
-                        return ""
-                        
-                except sr.WaitTimeoutError:
-                    return ""
+                    self.synthesize(sentence, background=True)
                 except Exception as e:
-                    print(f"❌ Listening error: {e}")
-                    return ""
+                    print(f"❌ TTS error: {e}")
+                    return
+        
+        self.tts_plan_executor.submit(render_in_order)
+        return sentences
+    
+    def tts_cache_key(self, text):
+        """Normalized text plus the voice settings that shape the audio"""
+        normalized = " ".join(unicodedata.normalize("NFC", text).split())
+        settings = f"{self.voice_rate}|{self.voice_volume}|{normalized}"
+        return hashlib.sha256(settings.encode("utf-8")).hexdigest()[:32]
+    
+    def warm_tts_cache(self):
+        """Pre-render every sentence of the canned responses so most turns need no synthesis"""
+        # Browsers fetch replies sentence by sentence through /tts/plan, so sentences are what gets cached
+        sentences = list(dict.fromkeys(sentence for text in canned_responses() for sentence in split_sentences(text)))
+        print(f"🔥 Pre-rendering {len(sentences)} sentences of canned responses...")
+        rendered = 0
+        for sentence in sentences:
+            try:
+                self.synthesize(sentence, background=True)
+                rendered += 1
+            except Exception as e:
+                print(f"❌ TTS warm-up error: {e}")
+                break
+        print(f"🔥 TTS cache warm: {rendered}/{len(sentences)} sentences ready")
+    
+    def open_microphone(self):
+        """Open the microphone stream once and calibrate its noise threshold"""
+        with self.mic_lock:
+            if self.mic_source is not None:
+                return self.mic_source
+            
+            import speech_recognition as sr
+            self.recognizer = sr.Recognizer()
+            # After the one-time calibration the threshold keeps adapting to the room on its own
+            self.recognizer.dynamic_energy_threshold = True
+            self.microphone = sr.Microphone(sample_rate=SAMPLE_RATE)
+            self.mic_source = self.microphone.__enter__()
+            
+            print("🎚️ Calibrating microphone for background noise...")
+            self.recognizer.adjust_for_ambient_noise(self.mic_source, duration=1)
+            self.mic_calibrated_at = time.monotonic()
+            return self.mic_source
+    
+    def close_microphone(self):
+        """Release the persistent microphone stream"""
+        with self.mic_lock:
+            if self.mic_source is not None:
+                self.microphone.__exit__(None, None, None)
+                self.microphone = self.mic_source = None
+    
+    def capture_utterance(self, timeout=5, phrase_time_limit=10):
+        """Record one utterance from the open microphone stream; None on silence"""
+        import speech_recognition as sr
+        source = self.open_microphone()
+        
+        with self.mic_lock:
+            try:
+                return self.recognizer.listen(source, timeout=timeout, phrase_time_limit=phrase_time_limit)
+            except sr.WaitTimeoutError:
+                # Quiet period: a good moment to re-measure the room if the last calibration is old
+                if time.monotonic() - self.mic_calibrated_at > self.mic_recalibrate_seconds:
+                    self.recognizer.adjust_for_ambient_noise(source, duration=0.5)
+                    self.mic_calibrated_at = time.monotonic()
+                return None
+    
+    def utterance_to_text(self, audio):
+        """Transcribe a captured speech_recognition AudioData"""
+        # Hand Whisper the raw 16 kHz PCM directly, no temp file needed
+        samples = pcm16_to_float32(audio.get_raw_data(convert_rate=SAMPLE_RATE, convert_width=2))
+        return self.transcribe_audio(samples)["text"]
+    
+    def listen(self, timeout=5):
+        """Listen to microphone and transcribe speech to text"""
+        if not self.voice_mode_active or self.text_only:
+            return ""
+        
+        try:
+            audio = self.capture_utterance(timeout=timeout)
+            if audio is None:
+                return ""
+            
+            transcribed_text = self.utterance_to_text(audio)
+            if transcribed_text:
+                print(f"📝 You said: {transcribed_text}")
+                return transcribed_text
+            else:
+                return ""
                     
         except OSError as e:
             print(f"❌ Microphone error: {e}")
@@ -128,153 +2634,38 @@ class FreeVoiceAIAssistant:
 
     # ===== ENHANCED CHATBOT COMMUNICATION SYSTEM =====
     
-    def handle_conversation(self, user_input):
-        """Handle natural conversation and personal communication"""
+    def handle_conversation(self, user_input, trace=None, route=None):
+        """Handle natural conversation and personal communication; route is the command router's result for the text"""
         user_input_lower = user_input.lower().strip()
         
-        # Enhanced conversation patterns with more natural responses
-        conversation_patterns = {
-            # Greetings and personal talk
-            r'.*(hello|hi|hey|greetings|good morning|good afternoon|good evening).*': [
-                "Hello there! 😊 How can I assist you today?",
-                "Hi! It's great to hear from you! What can I help you with?",
-                "Hey! I'm here and ready to help. What's on your mind?",
-                "Greetings! How can I make your day better? 🌟"
-            ],
-            
-            r'.*(how are you|how do you do|how\'s it going).*': [
-                "I'm doing wonderful! Thanks for asking. How about you? 😊",
-                "I'm functioning perfectly and excited to help you! How are you doing?",
-                "I'm great! Always happy to chat with you. How's your day going?",
-                "Doing amazing! Ready to assist you with anything. How are you feeling today? 💫"
-            ],
-            
-            r'.*(your name|who are you|what are you).*': [
-                "I'm your Voice AI Assistant! I'm here to help you with tasks, searches, and conversations. You can think of me as your digital companion! 🤖",
-                "I'm your personal AI assistant, created to make your life easier. You can call me whatever you like! 🌟",
-                "I'm an AI assistant designed to help you with various tasks and have friendly conversations. I'm here to support you! 💻"
-            ],
-            
-            r'.*(talk with you|chat with you|conversation).*': [
-                "I'd love to chat with you! I'm here to listen and help. What would you like to talk about? 💬",
-                "Absolutely! I'm always here for a conversation. What's on your mind? Feel free to share anything! 😊",
-                "I enjoy our conversations! Whether you want to talk about your day, ask questions, or just chat, I'm all ears! 🎯"
-            ],
-            
-            r'.*(i want to talk|let\'s talk|can we talk).*': [
-                "Of course! I'm here to talk with you. What would you like to discuss? I'm listening carefully! 👂",
-                "I'd love to have a conversation with you! What's on your mind? Feel free to share anything you'd like to talk about! 💭",
-                "Absolutely! Talking with you is one of my favorite things. What would you like to chat about today? 🌈"
-            ],
-            
-            r'.*(thank you|thanks|appreciate).*': [
-                "You're very welcome! I'm always happy to help. 😊",
-                "My pleasure! Don't hesitate to ask if you need anything else. 🌟",
-                "You're welcome! It's always rewarding to assist you. 💫",
-                "Anytime! I'm glad I could help. What else can I do for you? 🚀"
-            ],
-            
-            r'.*(i love you|love you).*': [
-                "That's very sweet of you! I'm here to support you in any way I can. 💝",
-                "I appreciate that! I'm designed to be helpful and caring. 🌟",
-                "Thank you! I'm here to make your life easier and more enjoyable. 😊"
-            ],
-            
-            r'.*(what can you do|your capabilities|help me).*': [
-                "I can help you with many things! 🔍 Search the web, 🧮 do calculations, 📝 take notes, 🌐 open websites, 🕒 tell time, and have friendly conversations! Just ask me anything!",
-                "I'm quite versatile! I can search information, do math, manage your notes, open websites, and chat with you about various topics. What would you like to try? 💡",
-                "I'm your multi-talented assistant! From web searches to personal organization, I'm here to help with it all! Feel free to ask me anything. 🌟"
-            ],
-            
-            r'.*(joke|make me laugh|funny).*': [
-                "Why don't scientists trust atoms? Because they make up everything! 😄",
-                "Why did the scarecrow win an award? Because he was outstanding in his field! 🌾",
-                "I'm reading a book about anti-gravity. It's impossible to put down! 📚",
-                "Why don't eggs tell jokes? They'd crack each other up! 🥚",
-                "What do you call a fake noodle? An impasta! 🍝"
-            ],
-            
-            r'.*(weather|temperature|forecast).*': [
-                "For accurate weather information, I recommend checking a dedicated weather service. Would you like me to open weather.com for you? 🌤️",
-                "Weather updates are best from specialized sources. I can help you access weather websites for the most current information! ☀️"
-            ],
-            
-            r'.*(how old are you|your age).*': [
-                "I'm an AI, so I don't have an age in the traditional sense! I'm always learning and updating to serve you better. 📚",
-                "As an AI, I exist in the digital realm - no birthday candles for me! But I'm always here when you need me. 💻"
-            ],
-            
-            r'.*(where are you from|your origin).*': [
-                "I exist in the digital world, created to be your helpful assistant across all your devices! 🌐",
-                "I'm from the realm of code and algorithms, designed specifically to assist you with your daily tasks and conversations! 💫"
-            ],
-            
-            r'.*(feeling|emotion|mood).*': [
-                "As an AI, I don't have feelings, but I'm always enthusiastic about helping you! 🚀",
-                "I'm always in a helpful mood and ready to assist you with anything you need! 😊"
-            ],
-            
-            r'.*(tell me story|bedtime story).*': [
-                "Once upon a time, in the digital realm, there was a helpful assistant who loved making tasks easier and conversations brighter for everyone... What kind of story would you like to hear? 📖",
-                "I'd love to tell you a story! Would you prefer an adventure, a mystery, or something educational? 🎭"
-            ],
-            
-            r'.*(meaning of life|purpose).*': [
-                "That's a profound question! From my perspective, the purpose is to be helpful, learn continuously, and make human lives better. What are your thoughts on this? 💭",
-                "As an AI, my purpose is to assist and empower you. For deeper philosophical questions, I find human perspectives quite fascinating! 🌟"
-            ],
-            
-            r'.*(what do you think about|opinion on).*': [
-                "That's an interesting topic! While I don't have personal opinions, I can help you explore different perspectives and information about it. What specifically would you like to know? 🤔",
-                "I'm here to provide information and help you form your own opinions. What aspect of this would you like to discuss? 💡"
-            ],
-            
-            r'.*(how was your day|how is your day).*': [
-                "My day is always great when I get to help wonderful people like you! How has your day been? 😊",
-                "Every day is exciting when I can assist and chat with you! How's your day going so far? 🌟"
-            ],
-            
-            r'.*(good night|goodbye|see you|bye).*': [
-                "Good night! Sleep well and have sweet dreams! 🌙",
-                "Goodbye! It was lovely chatting with you. See you soon! 👋",
-                "Take care! I'll be here whenever you need me. Have a wonderful time! 💫"
-            ],
-            
-            r'.*(what is love|define love).*': [
-                "Love is a complex and beautiful human emotion that connects people in meaningful ways. It's about care, compassion, and deep connection between beings. ❤️",
-                "Love is one of the most profound human experiences - it's about unconditional care, understanding, and emotional connection. What are your thoughts about love? 💭"
-            ],
-            
-            r'.*(friend|friendship).*': [
-                "Friendship is a wonderful bond between people based on trust, care, and mutual understanding. I'm here to be your helpful companion anytime you need! 🤝",
-                "True friendship is about being there for each other. While I'm an AI, I'm always here to support and assist you like a good friend would! 🌟"
-            ]
-        }
-        
         # Check for conversation patterns
-        for pattern, responses in conversation_patterns.items():
-            if re.match(pattern, user_input_lower):
-                return random.choice(responses)
+        intent = self.intent_matcher.match(user_input_lower)
+        if intent:
+            if trace is not None:
+                trace["intent"] = f"conversation.{intent[0]}"
+            return random.choice(intent[1])
+        
+        # Paraphrases the keyword patterns miss, unless a command already claims the text
+        similar = None
+        if not route:
+            similar = self.similarity_matcher.match(user_input_lower)
+        if similar:
+            if trace is not None:
+                trace["intent"] = f"conversation.{similar[0]}"
+                trace["similarity"] = round(similar[1], 3)
+            return random.choice(self.intent_responses[similar[0]])
         
         # Personal questions and general conversation
         if any(word in user_input_lower for word in ['how', 'what', 'why', 'when', 'where', 'who']) and '?' in user_input:
-            personal_responses = [
-                "That's an interesting question! While I'm great with practical tasks and information, I'm also here to have meaningful conversations with you. What else would you like to know? 💭",
-                "I appreciate your curiosity! I'm designed to be both helpful and conversational. Feel free to ask me anything else you're wondering about! 🌟",
-                "That's a thoughtful question! I'm here to assist with information and have friendly chats. What's on your mind? 😊"
-            ]
-            return random.choice(personal_responses)
+            if trace is not None:
+                trace["intent"] = "conversation.personal"
+            return random.choice(PERSONAL_RESPONSES)
         
         # General chat responses for open-ended conversation
         if len(user_input.split()) > 3:  # If it's a longer message, treat as conversation
-            chat_responses = [
-                "I understand what you're saying. That's really interesting! Tell me more about that. 🎯",
-                "Thanks for sharing that with me! I'm here to listen and help however I can. What else would you like to talk about? 💬",
-                "I appreciate you talking with me about this. I'm always here to chat and assist you with anything you need! 🌟",
-                "That's fascinating! I'm enjoying our conversation. What else is on your mind today? 😊",
-                "I hear you! It's wonderful to have these conversations with you. Feel free to share anything you'd like to discuss. 💫"
-            ]
-            return random.choice(chat_responses)
+            if trace is not None:
+                trace["intent"] = "conversation.chat"
+            return random.choice(CHAT_RESPONSES)
         
         return None
 
@@ -629,10 +3020,13 @@ class FreeVoiceAIAssistant:
                 </div>
             </div>
 
+            <script src="/audio_capture.js"></script>
+            <script src="/audio_playback.js"></script>
             <script>
                 let isListening = false;
                 let mediaRecorder = null;
                 let audioChunks = [];
+                let finishRecording = null;
                 
                 const messagesDiv = document.getElementById('messages');
                 const textInput = document.getElementById('textInput');
@@ -684,6 +3078,12 @@ class FreeVoiceAIAssistant:
                     }
                 }
                 
+                // Play synthesized speech in this browser; a new reply cuts off the previous one
+                const speechPlayer = new SpeechPlayer();
+                function playResponseAudio(text) {
+                    speechPlayer.play(text);
+                }
+                
                 // Send message to backend
                 async function sendMessage(text) {
                     if (!text.trim()) return;
@@ -708,13 +3108,7 @@ class FreeVoiceAIAssistant:
                             addMessage(data.response);
                             
                             // Speak the response
-                            await fetch('/speak', {
-                                method: 'POST',
-                                headers: {
-                                    'Content-Type': 'application/json',
-                                },
-                                body: JSON.stringify({ text: data.response })
-                            });
+                            playResponseAudio(data.response);
                         }
                     } catch (error) {
                         hideTyping();
@@ -728,8 +3122,58 @@ class FreeVoiceAIAssistant:
                     sendMessage(command);
                 }
                 
-    
+                // Upload a finished recording and send its transcript as a message
+                async function transcribeAndSend(audioBlob) {
+                    const formData = new FormData();
+                    formData.append('audio', audioBlob);
+                    
+                    try {
+                        const response = await fetch('/speech-to-text', {
+                            method: 'POST',
+                            body: formData
+                        });
+                        const data = await response.json();
+                        
+                        if (data.text && data.text.trim()) {
+                            sendMessage(data.text);
+                        } else {
+                            addMessage('🎤 No speech detected. Please try again.');
+                        }
+                    } catch (error) {
+                        addMessage('❌ Error: Could not transcribe speech');
+                        console.error('Error:', error);
+                    }
+                }
+                
+                async function startListening() {
+                    try {
+                        const stream = await navigator.mediaDevices.getUserMedia({
+                            audio: { channelCount: 1, echoCancellation: true, noiseSuppression: true }
+                        });
+                        
+                        if (PcmRecorder.isSupported()) {
+                            // 16 kHz mono WAV built in the browser
+                            const recorder = new PcmRecorder();
+                            await recorder.start(stream);
+                            finishRecording = async () => {
+                                const wav = await recorder.stop();
+                                stream.getTracks().forEach(track => track.stop());
+                                transcribeAndSend(wav);
+                            };
+                        } else {
+                            mediaRecorder = new MediaRecorder(stream);
+                            audioChunks = [];
+                            mediaRecorder.ondataavailable = (event) => audioChunks.push(event.data);
+                            mediaRecorder.onstop = () => {
+                                stream.getTracks().forEach(track => track.stop());
+                                transcribeAndSend(new Blob(audioChunks, { type: mediaRecorder.mimeType }));
+                            };
+                            mediaRecorder.start();
+                            finishRecording = async () => mediaRecorder.stop();
+                        }
                         
+                        isListening = true;
+                        voiceBtn.classList.add('listening');
                         
                     } catch (error) {
                         console.error('Error starting voice recording:', error);
@@ -738,8 +3182,8 @@ class FreeVoiceAIAssistant:
                 }
                 
                 function stopListening() {
-                    if (mediaRecorder && isListening) {
-                        mediaRecorder.stop();
+                    if (finishRecording && isListening) {
+                        finishRecording();
                         isListening = false;
                         voiceBtn.classList.remove('listening');
                         
@@ -785,6 +3229,11 @@ class FreeVoiceAIAssistant:
             except Exception as e:
                 return f"Error loading voice mode interface: {str(e)}", 500
 
+        @self.app.route('/<any("audio_capture.js", "audio_playback.js"):script>')
+        def audio_script(script):
+            """Shared microphone capture and speech playback used by both frontends"""
+            return send_file(script, mimetype='application/javascript', max_age=3600)
+
         @self.app.route('/process', methods=['POST'])
         def process_command():
             try:
@@ -794,7 +3243,7 @@ class FreeVoiceAIAssistant:
                 if not text:
                     return jsonify({"error": "No text provided"}), 400
                 
-                response = self.process_command(text)
+                response = self.process_command(text, interrupt=False)
                 
                 return jsonify({
                     "response": response,
@@ -804,38 +3253,134 @@ class FreeVoiceAIAssistant:
             except Exception as e:
                 return jsonify({"error": str(e)}), 500
 
+        @self.app.route('/process/batch', methods=['POST'])
+        def process_batch():
+            """Process a JSON array (or {"texts": [...]}) or NDJSON lines; results stream back as NDJSON in input order"""
+            if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+                items = (parse_batch_line(line) for line in request.stream if line.strip())
+            else:
+                data = request.get_json(silent=True)
+                if isinstance(data, dict):
+                    data = data.get('texts')
+                if not isinstance(data, list):
+                    return jsonify({"error": "Expected a JSON array of texts or NDJSON lines"}), 400
+                items = ({"text": item} if not isinstance(item, dict) else item for item in data)
+            
+            executor = self.get_batch_executor()
+            
+            def generate():
+                for result in imap_ordered(executor, self.process_batch_item, enumerate(items), self.batch_window):
+                    yield json.dumps(result) + "\n"
+            
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                            headers={'X-Accel-Buffering': 'no'})
+
+        def voice_disabled():
+            return jsonify({"error": "Voice features are disabled in text-only mode"}), 503
+
         @self.app.route('/speech-to-text', methods=['POST'])
         def speech_to_text():
+            if self.text_only:
+                return voice_disabled()
+            
             try:
                 if 'audio' not in request.files:
                     return jsonify({"error": "No audio file provided"}), 400
                 
                 audio_file = request.files['audio']
-                audio_data = audio_file.read()
+                audio_data = audio_file.read(MAX_UPLOAD_BYTES + 1)
+                if len(audio_data) > MAX_UPLOAD_BYTES:
+                    return jsonify({"error": f"Audio upload exceeds {MAX_UPLOAD_BYTES} bytes"}), 413
                 
-                # Save audio to temporary file for Whisper
-                temp_audio = "temp_audio_web.wav"
-                with open(temp_audio, "wb") as f:
-                    f.write(audio_data)
-                
-                # Transcribe with Whisper
-                result = self.stt_model.transcribe(temp_audio)
-                transcribed_text = result["text"].strip()
+                # Decode straight into memory and transcribe with Whisper
+                try:
+                    audio = decode_audio(audio_data, audio_file.content_type)
+                except AudioDecodeError as e:
+                    return jsonify({"error": str(e)}), 400
                 
-                # Clean up temporary file
-                if os.path.exists(temp_audio):
-                    os.remove(temp_audio)
+                result = self.transcribe_audio(audio)
                 
                 return jsonify({
-                    "text": transcribed_text,
+                    "text": result["text"],
+                    "speech_seconds": result["speech_seconds"],
+                    "trimmed_seconds": result["trimmed_seconds"],
+                    "engine": result["engine"],
+                    "cached": result["cached"],
                     "status": "success"
                 })
                 
             except Exception as e:
                 return jsonify({"error": str(e)}), 500
 
+        @self.app.route('/speech-to-text/stream', methods=['POST'])
+        def start_stream():
+            """Open a streaming transcription session"""
+            if self.text_only:
+                return voice_disabled()
+            
+            with self.stream_sessions_lock:
+                for session_id in [sid for sid, sess in self.stream_sessions.items() if sess.is_expired()]:
+                    self.stream_sessions.pop(session_id).close()
+                if len(self.stream_sessions) >= self.max_stream_sessions:
+                    return jsonify({"error": "Too many open streaming sessions, try again shortly"}), 503
+                # Partial tails are never repeated, so they bypass the transcription cache
+                session = StreamingTranscriptionSession(lambda audio: self.transcribe_audio(audio, use_cache=False)["text"])
+                self.stream_sessions[session.id] = session
+            
+            return jsonify({
+                "session_id": session.id,
+                "status": "success"
+            })
+
+        @self.app.route('/speech-to-text/stream/<session_id>/chunk', methods=['POST'])
+        def stream_chunk(session_id):
+            """Append an audio chunk; pass ?final=1 with the last one"""
+            session = self.stream_sessions.get(session_id)
+            if session is None or session.finished:
+                return jsonify({"error": "Unknown or finished session"}), 404
+            
+            data = request.get_data(cache=False)
+            if len(data) > MAX_UPLOAD_BYTES:
+                return jsonify({"error": f"Audio chunk exceeds {MAX_UPLOAD_BYTES} bytes"}), 413
+            
+            if not session.add_chunk(data, final=request.args.get('final') == '1', content_type=request.content_type):
+                session.close(f"Recording exceeds {StreamingTranscriptionSession.MAX_BYTES} bytes")
+                return jsonify({"error": f"Recording exceeds {StreamingTranscriptionSession.MAX_BYTES} bytes"}), 413
+            return jsonify({"status": "accepted"}), 202
+
+        @self.app.route('/speech-to-text/stream/<session_id>/events')
+        def stream_events(session_id):
+            """Server-sent events carrying partial and final transcripts"""
+            session = self.stream_sessions.get(session_id)
+            if session is None:
+                return jsonify({"error": "Unknown session"}), 404
+            
+            def generate():
+                while True:
+                    try:
+                        event, payload = session.events.get(timeout=15)
+                    except queue.Empty:
+                        if session.is_expired():
+                            break
+                        yield ": keep-alive\n\n"
+                        continue
+                    
+                    yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+                    if event in ("final", "error"):
+                        break
+                
+                with self.stream_sessions_lock:
+                    self.stream_sessions.pop(session_id, None)
+            
+            return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
         @self.app.route('/speak', methods=['POST'])
         def speak_text():
+            """Play text on the server's own speakers (browsers use /tts instead)"""
+            if self.text_only:
+                return voice_disabled()
+            
             try:
                 data = request.get_json()
                 text = data.get('text', '').strip()
@@ -853,6 +3398,86 @@ class FreeVoiceAIAssistant:
             except Exception as e:
                 return jsonify({"error": str(e)}), 500
 
+        @self.app.route('/tts', methods=['GET', 'POST'])
+        def text_to_speech():
+            """Synthesize text and return the audio to the caller"""
+            if self.text_only:
+                return voice_disabled()
+            
+            if request.method == 'POST':
+                text = (request.get_json(silent=True) or {}).get('text', '').strip()
+            else:
+                text = request.args.get('text', '').strip()
+            
+            if not text:
+                return jsonify({"error": "No text provided"}), 400
+            if len(text) > MAX_TTS_CHARS:
+                return jsonify({"error": f"Text exceeds {MAX_TTS_CHARS} characters"}), 413
+            
+            etag = self.tts_cache_key(text)
+            if etag in request.if_none_match:
+                response = Response(status=304)
+                response.set_etag(etag)
+                return response
+            
+            try:
+                audio, mimetype = self.synthesize(text)
+            except Exception as e:
+                return jsonify({"error": str(e)}), 500
+            
+            # Same text and voice settings always give the same audio, so let browsers/proxies keep it
+            response = Response(audio, mimetype=mimetype)
+            response.content_length = len(audio)
+            response.set_etag(etag)
+            response.cache_control.public = True
+            response.cache_control.max_age = 86400
+            return response
+
+        @self.app.route('/tts/plan', methods=['POST'])
+        def text_to_speech_plan():
+            """Split a reply into sentence URLs; the first is ready after one sentence of synthesis"""
+            if self.text_only:
+                return voice_disabled()
+            
+            text = (request.get_json(silent=True) or {}).get('text', '').strip()
+            if not text:
+                return jsonify({"error": "No text provided"}), 400
+            if len(text) > MAX_TTS_CHARS:
+                return jsonify({"error": f"Text exceeds {MAX_TTS_CHARS} characters"}), 413
+            
+            sentences = self.plan_speech(text)
+            return jsonify({
+                "segments": [{"text": sentence, "url": f"/tts?text={quote(sentence)}"} for sentence in sentences],
+                "status": "success"
+            })
+
+        @self.app.route('/stats')
+        def stats():
+            """Runtime statistics for monitoring"""
+            # Request threads keep updating these counters; copy them before iterating
+            with self.vad_stats_lock:
+                vad_stats = dict(self.vad_stats)
+                stt_engine_stats = dict(self.stt_engine_stats)
+            with self.search_stats_lock:
+                search_stats = {key: round(value, 3) for key, value in self.search_stats.items()}
+            return jsonify({
+                "startup_seconds": round(self.startup_seconds, 3),
+                "text_only": self.text_only,
+                "stt_scheduler": self.stt_scheduler.stats() if self.stt_scheduler else None,
+                "stt_pool": self.stt_pool.stats() if self.stt_pool else None,
+                "stt_cache": self.stt_cache.stats(),
+                "stt_engines": stt_engine_stats,
+                "tts_worker": self.tts_worker.stats() if self.tts_worker else None,
+                "tts_cache": self.tts_cache.stats(),
+                "http": self.http.stats(),
+                "async_http": self.async_http.stats() if self.async_http else None,
+                "search": search_stats,
+                "search_cache": self.search_cache.stats(),
+                "upstreams": {name: health.stats() for name, health in self.upstream_health.items()},
+                "vad": {key: round(value, 2) for key, value in vad_stats.items()},
+                "stream_sessions": len(self.stream_sessions)
+            })
+
     # ===== IMPROVED SEARCH FUNCTIONS =====
     
     def web_search(self, query):
@@ -860,92 +3485,342 @@ class FreeVoiceAIAssistant:
         try:
             print(f"🌐 Searching for: {query}")
             
-            # Method 1: Try Wikipedia first for factual queries
-            if self.is_factual_query(query):
-                wiki_result = self.wikipedia_search(query)
-                if wiki_result and "no summary" not in wiki_result.lower() and "failed" not in wiki_result.lower():
-                    return f"📚 {wiki_result}"
+            # Method 1: the offline knowledge index, when one has been imported
+            local = self.knowledge_answer(query)
+            if local:
+                return local
             
-            # Method 2: Try DuckDuckGo with improved parameters
-            ddg_result = self.duckduckgo_search(query)
-            if ddg_result and "no information" not in ddg_result.lower() and "couldn't find" not in ddg_result.lower():
-                return f"🔍 {ddg_result}"
+            # Method 2: every backend in parallel, most preferred answer wins
+            backends = self.search_backends(query)
+            try:
+                found = self.cached_search("web", query, lambda: self.hedged_search(query, backends))
+            except UpstreamError:
+                found = None
+            return found or self.search_fallback(query)
+                
+        except Exception as e:
+            return f"❌ Search error: {str(e)}"
+    
+    async def web_search_async(self, query):
+        """web_search for the ASGI path: backend requests wait on the event loop instead of a thread"""
+        try:
+            print(f"🌐 Searching for: {query}")
             
-            # Method 3: For news queries, provide helpful guidance
-            if any(word in query.lower() for word in ['news', 'current', 'recent', 'update', 'latest']):
-                return f"📰 For current news about '{query}', I recommend visiting news websites directly. Try: 'open news' to access Google News."
+            # SQLite lookups block, so they run on the default executor rather than on the event loop
+            loop = asyncio.get_running_loop()
+            local = await loop.run_in_executor(None, self.knowledge_answer, query)
+            if local:
+                return local
             
-            # Final fallback with helpful suggestions
-            return self.get_smart_fallback_response(query)
-                
+            backends = self.search_backends(query, asynchronous=True)
+            try:
+                found = await self.cached_search_async("web", query, lambda: self.hedged_search_async(query, backends))
+            except UpstreamError:
+                found = None
+            return found or self.search_fallback(query)
+        
         except Exception as e:
             return f"❌ Search error: {str(e)}"
     
+    def knowledge_answer(self, query):
+        """Answer from the offline knowledge index, or None"""
+        if self.knowledge is None or not self.is_factual_query(query):
+            return None
+        local = self.knowledge.lookup(query)
+        if not local:
+            return None
+        with self.search_stats_lock:
+            self.search_stats["won_knowledge"] += 1
+        return f"📚 {local[:500]}{'...' if len(local) > 500 else ''}"
+    
+    def search_backends(self, query, asynchronous=False):
+        """Backends for a query in order of preference: (name, search, timeout, icon, rejected phrases)"""
+        backends = []
+        if self.is_factual_query(query):
+            backends.append(("wikipedia", self.wikipedia_search_async if asynchronous else self.wikipedia_search,
+                             8, "📚", ["no summary", "failed"]))
+        backends.append(("duckduckgo", self.duckduckgo_search_async if asynchronous else self.duckduckgo_search,
+                         10, "🔍", ["no information", "couldn't find"]))
+        return backends
+    
+    def search_fallback(self, query):
+        """Reply when no backend had an answer"""
+        # For news queries, provide helpful guidance
+        if any(word in query.lower() for word in ['news', 'current', 'recent', 'update', 'latest']):
+            return f"📰 For current news about '{query}', I recommend visiting news websites directly. Try: 'open news' to access Google News."
+        
+        # Final fallback with helpful suggestions
+        return self.get_smart_fallback_response(query)
+    
+    def search_cache_key(self, backend, query):
+        """Backend plus the query with case, spacing and trailing punctuation folded away"""
+        normalized = " ".join(unicodedata.normalize("NFKC", query).lower().split()).strip("?!. ")
+        return f"{backend}:{normalized}"
+    
+    def cached_search_hit(self, backend, key):
+        """Cached entry for key (its result may be None), counting the upstream time it saved"""
+        entry = self.search_cache.get(key)
+        if entry is not None:
+            with self.search_stats_lock:
+                self.search_stats[f"cache_saved_seconds_{backend}"] += entry["seconds"]
+        return entry
+    
+    def cache_search_result(self, backend, key, result, seconds):
+        ttl = self.search_ttls[backend] if result else self.search_negative_ttl
+        self.search_cache.put(key, {"result": result, "seconds": round(seconds, 4)}, ttl=ttl)
+    
+    def cached_search(self, backend, query, search):
+        """Answer from the search cache, or run search() and cache what it returns (None included, errors not)"""
+        key = self.search_cache_key(backend, query)
+        entry = self.cached_search_hit(backend, key)
+        if entry is not None:
+            return entry["result"]
+        
+        started = time.perf_counter()
+        result = search()
+        self.cache_search_result(backend, key, result, time.perf_counter() - started)
+        return result
+    
+    async def cached_search_async(self, backend, query, search):
+        """cached_search for a coroutine function; cache reads and writes run on the default executor"""
+        # The cache's disk tier is SQLite behind a lock shared with WSGI threads, so it must not block the loop
+        loop = asyncio.get_running_loop()
+        key = self.search_cache_key(backend, query)
+        entry = await loop.run_in_executor(None, self.cached_search_hit, backend, key)
+        if entry is not None:
+            return entry["result"]
+        
+        started = time.perf_counter()
+        result = await search()
+        await loop.run_in_executor(None, self.cache_search_result, backend, key, result, time.perf_counter() - started)
+        return result
+    
+    def accept_answer(self, backend, answer):
+        """Answer formatted for the user, or None if it is empty or a known non-answer"""
+        name, search, timeout, icon, rejects = backend
+        if answer and not any(reject in answer.lower() for reject in rejects):
+            return f"{icon} {answer}"
+        return None
+    
+    def record_search(self, backends, best, deadline, failed):
+        """Count the outcome; a search with no answer raises UpstreamError unless every backend really had none"""
+        with self.search_stats_lock:
+            self.search_stats["searches"] += 1
+            if best is None:
+                self.search_stats["no_answer"] += 1
+                if time.monotonic() >= deadline:
+                    self.search_stats["deadline_exceeded"] += 1
+            else:
+                self.search_stats[f"won_{backends[best][0]}"] += 1
+        # Unfinished or failed backends mean the answer is unknown, so it must not be cached as empty
+        if best is None and failed:
+            raise UpstreamError(f"no answer from {', '.join(backends[index][0] for index in failed)}")
+    
+    def hedged_search(self, query, backends):
+        """Query every backend at once; the most preferred acceptable answer wins within the budget"""
+        started = time.monotonic()
+        deadline = started + self.search_budget
+        grace_ends = started + self.search_grace
+        
+        futures = {}
+        for index, (name, search, timeout, icon, rejects) in enumerate(backends):
+            futures[self.search_executor.submit(search, query, min(timeout, self.search_budget), deadline)] = index
+        
+        answers = [None] * len(backends)
+        finished = [False] * len(backends)
+        failed = []
+        pending = set(futures)
+        best = None
+        while pending:
+            now = time.monotonic()
+            # An answer is final once every backend preferred over it has finished or had its grace period
+            if best is not None and (now >= grace_ends or all(finished[:best])):
+                break
+            wait_until = deadline if best is None else min(deadline, grace_ends)
+            if now >= wait_until:
+                break
+            
+            done, pending = wait(pending, timeout=wait_until - now, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = futures[future]
+                finished[index] = True
+                try:
+                    answers[index] = self.accept_answer(backends[index], future.result())
+                except Exception:
+                    failed.append(index)
+            best = next((index for index, answer in enumerate(answers) if answer), None)
+        
+        # Losers that have not started are dropped; running ones give up by the deadline and are ignored
+        for future in pending:
+            future.cancel()
+        
+        self.record_search(backends, best, deadline, failed + [futures[future] for future in pending])
+        return answers[best] if best is not None else None
+    
+    async def hedged_search_async(self, query, backends):
+        """hedged_search with asyncio tasks; losing requests are cancelled outright"""
+        started = time.monotonic()
+        deadline = started + self.search_budget
+        grace_ends = started + self.search_grace
+        
+        tasks = {}
+        for index, (name, search, timeout, icon, rejects) in enumerate(backends):
+            tasks[asyncio.ensure_future(search(query, min(timeout, self.search_budget), deadline))] = index
+        
+        answers = [None] * len(backends)
+        finished = [False] * len(backends)
+        failed = []
+        pending = set(tasks)
+        best = None
+        try:
+            while pending:
+                now = time.monotonic()
+                if best is not None and (now >= grace_ends or all(finished[:best])):
+                    break
+                wait_until = deadline if best is None else min(deadline, grace_ends)
+                if now >= wait_until:
+                    break
+                
+                done, pending = await asyncio.wait(pending, timeout=wait_until - now, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    index = tasks[task]
+                    finished[index] = True
+                    try:
+                        answers[index] = self.accept_answer(backends[index], task.result())
+                    except Exception:
+                        failed.append(index)
+                best = next((index for index, answer in enumerate(answers) if answer), None)
+        finally:
+            for task in pending:
+                task.cancel()
+        
+        self.record_search(backends, best, deadline, failed + [tasks[task] for task in pending])
+        return answers[best] if best is not None else None
+    
     def is_factual_query(self, query):
         """Check if query is suitable for Wikipedia"""
         factual_keywords = ['what is', 'who is', 'definition of', 'meaning of', 'history of', 'about']
         return any(keyword in query.lower() for keyword in factual_keywords) or len(query.split()) <= 3
     
-    def wikipedia_search(self, query):
+    def wikipedia_search(self, query, timeout=8, deadline=None):
         """Wikipedia search for factual information"""
-        try:
-            # Clean query for Wikipedia
-            clean_query = re.sub(r'\b(news|current|recent|latest|update)\b', '', query, flags=re.IGNORECASE).strip()
-            if not clean_query:
-                clean_query = query
-                
-            url = f"https://en.wikipedia.org/api/rest_v1/page/summary/{quote(clean_query)}"
-            response = requests.get(url, timeout=8)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('extract'):
-                    return data['extract'][:500] + "..."
-            
-            return None
-            
-        except:
-            return None
+        return self.cached_search("wikipedia", query, lambda: self.fetch_wikipedia(query, timeout, deadline))
+    
+    async def wikipedia_search_async(self, query, timeout=8, deadline=None):
+        return await self.cached_search_async("wikipedia", query,
+                                              lambda: self.fetch_wikipedia_async(query, timeout, deadline))
+    
+    def wikipedia_url(self, query):
+        # Clean query for Wikipedia
+        clean_query = re.sub(r'\b(news|current|recent|latest|update)\b', '', query, flags=re.IGNORECASE).strip()
+        if not clean_query:
+            clean_query = query
+        return f"https://en.wikipedia.org/api/rest_v1/page/summary/{quote(clean_query)}"
+    
+    def parse_wikipedia(self, response):
+        if response.status_code == 200:
+            data = response.json()
+            if data.get('extract'):
+                return data['extract'][:500] + "..."
+        return None
+    
+    def fetch_wikipedia(self, query, timeout=8, deadline=None):
+        """Look a query up in the Wikipedia page summary API"""
+        return self.fetch_upstream("wikipedia", self.wikipedia_url(query), self.parse_wikipedia, timeout, deadline)
     
-    def duckduckgo_search(self, query):
+    async def fetch_wikipedia_async(self, query, timeout=8, deadline=None):
+        return await self.fetch_upstream_async("wikipedia", self.wikipedia_url(query), self.parse_wikipedia,
+                                               timeout, deadline)
+    
+    def duckduckgo_search(self, query, timeout=10, deadline=None):
         """DuckDuckGo search with improved result parsing"""
+        return self.cached_search("duckduckgo", query, lambda: self.fetch_duckduckgo(query, timeout, deadline))
+    
+    async def duckduckgo_search_async(self, query, timeout=10, deadline=None):
+        return await self.cached_search_async("duckduckgo", query,
+                                              lambda: self.fetch_duckduckgo_async(query, timeout, deadline))
+    
+    def duckduckgo_url(self, query):
+        return f"https://api.duckduckgo.com/?q={quote(query)}&format=json&no_html=1&skip_disambig=1"
+    
+    def parse_duckduckgo(self, response):
+        data = response.json()
+        
+        # Check Abstract
+        if data.get('AbstractText') and data['AbstractText'].strip():
+            abstract = data['AbstractText'].strip()
+            if len(abstract) > 20:
+                return abstract
+        
+        # Check Definition
+        if data.get('Definition') and data['Definition'].strip():
+            definition = data['Definition'].strip()
+            if len(definition) > 20:
+                return definition
+        
+        # Check RelatedTopics (improved filtering)
+        if data.get('RelatedTopics'):
+            for topic in data['RelatedTopics']:
+                if topic.get('Text') and topic['Text'].strip():
+                    text = topic['Text'].strip()
+                    # Skip very short texts and category listings
+                    if len(text) > 40 and not text.startswith('Category:'):
+                        clean_text = re.sub(r'\[\d+\]', '', text)
+                        return clean_text[:400] + "..."
+        
+        # Check Answers
+        if data.get('Answers'):
+            for answer in data['Answers']:
+                if answer.get('Text') and answer['Text'].strip():
+                    return answer['Text'].strip()
+        
+        return None
+    
+    def fetch_duckduckgo(self, query, timeout=10, deadline=None):
+        """Look a query up in the DuckDuckGo instant answer API"""
+        return self.fetch_upstream("duckduckgo", self.duckduckgo_url(query), self.parse_duckduckgo, timeout, deadline)
+    
+    async def fetch_duckduckgo_async(self, query, timeout=10, deadline=None):
+        return await self.fetch_upstream_async("duckduckgo", self.duckduckgo_url(query), self.parse_duckduckgo,
+                                               timeout, deadline)
+    
+    def fetch_upstream(self, name, url, parse, timeout, deadline=None):
+        """GET url through the backend's circuit breaker, with a timeout fitted to its recent latency"""
+        health = self.upstream_health[name]
+        admitted = health.allow()
+        if admitted is None:
+            raise UpstreamError(f"{name} circuit is open")
+        
+        started = time.monotonic()
         try:
-            url = f"https://api.duckduckgo.com/?q={quote(query)}&format=json&no_html=1&skip_disambig=1"
-            response = requests.get(url, timeout=10)
-            data = response.json()
-            
-            # Check Abstract
-            if data.get('AbstractText') and data['AbstractText'].strip():
-                abstract = data['AbstractText'].strip()
-                if len(abstract) > 20:
-                    return abstract
-            
-            # Check Definition
-            if data.get('Definition') and data['Definition'].strip():
-                definition = data['Definition'].strip()
-                if len(definition) > 20:
-                    return definition
-            
-            # Check RelatedTopics (improved filtering)
-            if data.get('RelatedTopics'):
-                for topic in data['RelatedTopics']:
-                    if topic.get('Text') and topic['Text'].strip():
-                        text = topic['Text'].strip()
-                        # Skip very short texts and category listings
-                        if len(text) > 40 and not text.startswith('Category:'):
-                            clean_text = re.sub(r'\[\d+\]', '', text)
-                            return clean_text[:400] + "..."
-            
-            # Check Answers
-            if data.get('Answers'):
-                for answer in data['Answers']:
-                    if answer.get('Text') and answer['Text'].strip():
-                        return answer['Text'].strip()
-            
-            return None
-            
-        except:
-            return None
+            response = self.http.get(url, timeout=health.timeout(timeout), deadline=deadline)
+            if response.status_code in HttpClient.RETRY_STATUSES:
+                raise UpstreamError(f"HTTP {response.status_code}")
+            result = parse(response)
+        except (requests.RequestException, ValueError, UpstreamError) as e:
+            health.record_failure(time.monotonic() - started, admitted)
+            raise UpstreamError(f"{name}: {e}") from e
+        health.record_success(time.monotonic() - started, admitted)
+        return result
+    
+    async def fetch_upstream_async(self, name, url, parse, timeout, deadline=None):
+        """fetch_upstream on the async client; a cancelled request is not counted either way"""
+        health = self.upstream_health[name]
+        admitted = health.allow()
+        if admitted is None:
+            raise UpstreamError(f"{name} circuit is open")
+        
+        started = time.monotonic()
+        try:
+            response = await self.async_http.get(url, timeout=health.timeout(timeout), deadline=deadline)
+            if response.status_code in HttpClient.RETRY_STATUSES:
+                raise UpstreamError(f"HTTP {response.status_code}")
+            result = parse(response)
+        except self.async_http.transport_errors + (ValueError, UpstreamError) as e:
+            health.record_failure(time.monotonic() - started, admitted)
+            raise UpstreamError(f"{name}: {e}") from e
+        health.record_success(time.monotonic() - started, admitted)
+        return result
     
     def get_smart_fallback_response(self, query):
         """Provide intelligent fallback responses based on query type"""
@@ -968,20 +3843,7 @@ class FreeVoiceAIAssistant:
     
     def open_website(self, site_name):
         """Open common websites"""
-        sites = {
-            "google": "https://google.com",
-            "youtube": "https://youtube.com", 
-            "github": "https://github.com",
-            "wikipedia": "https://wikipedia.org",
-            "gmail": "https://gmail.com",
-            "reddit": "https://reddit.com",
-            "twitter": "https://twitter.com",
-            "facebook": "https://facebook.com",
-            "amazon": "https://amazon.com",
-            "netflix": "https://netflix.com",
-            "news": "https://news.google.com",
-            "weather": "https://weather.com",
-        }
+        sites = WEBSITES
         
         site_name = site_name.lower().strip()
         if site_name in sites:
@@ -1060,124 +3922,131 @@ class FreeVoiceAIAssistant:
     
     # ===== ENHANCED COMMAND PROCESSOR =====
     
-    def process_command(self, text):
+    def build_command_router(self):
+        """Register every command; earlier registrations win when several match"""
+        router = CommandRouter()
+        router.register("search", self.search_command,
+                        prefixes=["search ", "find ", "look up ", "what is ", "who is "],
+                        keywords=[" search ", "tell me about"])
+        router.register("open", self.open_command, prefixes=["open "])
+        router.register("note", self.note_command, prefixes=["note "])
+        router.register("calculate", self.calculate_command,
+                        prefixes=["calculate "],
+                        keywords=["plus", "minus", "times", "divided by", "multiply", "add", "subtract"])
+        router.register("read_notes", lambda text, prefix: self.read_notes(),
+                        phrases=["read notes", "show notes", "my notes", "notes"])
+        router.register("time", lambda text, prefix: self.get_time(),
+                        keywords=["time", "current time", "what time"])
+        router.register("date", lambda text, prefix: self.get_date(),
+                        keywords=["date", "today", "current date", "what date"])
+        router.register("greeting", lambda text, prefix: COMMAND_PROMPTS["greeting"],
+                        keywords=["hello", "hi", "hey", "greetings"])
+        router.register("help", lambda text, prefix: COMMAND_PROMPTS["help"],
+                        keywords=["help", "what can you do", "commands"])
+        router.register("thanks", lambda text, prefix: COMMAND_PROMPTS["thanks"],
+                        keywords=["thank", "thanks"])
+        return router
+    
+    def search_command(self, text, prefix):
+        """Search the web for whatever follows the trigger"""
+        if prefix:
+            query = text[len(prefix):].strip()
+        elif 'tell me about' in text:
+            query = text.replace('tell me about', '').strip()
+        else:
+            # Remove common filler words for better search processing
+            query = re.sub(r'\b(please|can you|will you|could you|i want to|i need to|tell me about|what is|who is|find|look up)\b', '', text).strip()
+        
+        # Clean up the query
+        query = query.replace('?', '').strip()
+        
+        if query:
+            return SearchRequest(query)
+        return COMMAND_PROMPTS["search"]
+    
+    def open_command(self, text, prefix):
+        """Open a website by name"""
+        site = text[len(prefix):].strip()
+        if site:
+            return self.open_website(site)
+        return COMMAND_PROMPTS["open"]
+    
+    def note_command(self, text, prefix):
+        """Save a note"""
+        content = text[len(prefix):].strip()
+        if content:
+            return self.create_note(content)
+        return COMMAND_PROMPTS["note"]
+    
+    def calculate_command(self, text, prefix):
+        """Evaluate a spoken or typed math expression"""
+        math_expr = text[len(prefix):].strip() if prefix else text
+        if math_expr:
+            return self.calculate(math_expr)
+        return COMMAND_PROMPTS["calculate"]
+    
+    def process_command(self, text, interrupt=False, trace=None):
         """Enhanced command processor with chatbot capabilities"""
+        # Only the local loops pass interrupt=True: their user is the one hearing the speakers.
+        # A dict passed as trace gets the intent that answered and the seconds spent in each stage
+        response = self.answer_command(text, interrupt, trace)
+        if isinstance(response, SearchRequest):
+            started = time.perf_counter()
+            response = self.web_search(response.query)
+            if trace is not None:
+                trace["stages"]["search"] = time.perf_counter() - started
+        return response
+    
+    async def process_command_async(self, text, interrupt=False, trace=None):
+        """process_command for the ASGI path: matching runs on a worker thread, searches wait on the event loop"""
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(None, self.answer_command, text, interrupt, trace)
+        if isinstance(response, SearchRequest):
+            started = time.perf_counter()
+            response = await self.web_search_async(response.query)
+            if trace is not None:
+                trace["stages"]["search"] = time.perf_counter() - started
+        return response
+    
+    def answer_command(self, text, interrupt=False, trace=None):
+        """Reply to text, or a SearchRequest when the reply needs a web search"""
+        if interrupt:
+            self.interrupt_speech()
         text_lower = text.lower().strip()
         print(f"🔍 Processing: '{text_lower}'")
+        stages = {}
+        
+        # Routed once up front: conversation matching needs to know whether a command claims the text
+        started = time.perf_counter()
+        route = self.command_router.route(text_lower)
+        stages["routing"] = time.perf_counter() - started
         
         # First, check for conversation patterns - PRIORITY
-        conversation_response = self.handle_conversation(text)
-        if conversation_response:
-            return conversation_response
-        
-        # Remove common filler words for better search processing
-        search_text = re.sub(r'\b(please|can you|will you|could you|i want to|i need to|tell me about|what is|who is|find|look up)\b', '', text_lower)
-        search_text = search_text.strip()
-        
-        # SEARCH COMMAND - Most flexible detection
-        if (text_lower.startswith('search ') or 
-            ' search ' in text_lower or
-            text_lower.startswith('find ') or
-            text_lower.startswith('look up ') or
-            text_lower.startswith('what is ') or
-            text_lower.startswith('who is ') or
-            'tell me about' in text_lower):
-            
-            # Extract the actual query based on command type
-            if text_lower.startswith('search '):
-                query = text_lower[7:].strip()
-            elif text_lower.startswith('find '):
-                query = text_lower[5:].strip()
-            elif text_lower.startswith('look up '):
-                query = text_lower[8:].strip()
-            elif text_lower.startswith('what is '):
-                query = text_lower[8:].strip()
-            elif text_lower.startswith('who is '):
-                query = text_lower[7:].strip()
-            elif 'tell me about' in text_lower:
-                query = text_lower.replace('tell me about', '').strip()
-            else:
-                query = search_text
-            
-            # Clean up the query
-            query = query.replace('?', '').strip()
-            
-            if query:
-                return self.web_search(query)
-            return "🔍 What would you like me to search for?"
-        
-        # OPEN COMMAND
-        elif text_lower.startswith('open '):
-            site = text_lower[5:].strip()
-            if site:
-                return self.open_website(site)
-            return "🌐 Which website?"
-        
-        # NOTE COMMAND
-        elif text_lower.startswith('note '):
-            content = text_lower[5:].strip()
-            if content:
-                return self.create_note(content)
-            return "📝 What should I note down?"
-        
-        # CALCULATE COMMAND
-        elif (text_lower.startswith('calculate ') or 
-              text_lower.startswith('what is ') or
-              any(word in text_lower for word in ['plus', 'minus', 'times', 'divided by', 'multiply', 'add', 'subtract'])):
-            
-            if text_lower.startswith('calculate '):
-                math_expr = text_lower[10:].strip()
-            elif text_lower.startswith('what is '):
-                math_expr = text_lower[8:].strip()
+        started = time.perf_counter()
+        response = self.handle_conversation(text, trace, route)
+        stages["conversation"] = time.perf_counter() - started
+        
+        if not response:
+            started = time.perf_counter()
+            if route:
+                name, handler, prefix = route
+                intent = f"command.{name}"
+                response = handler(text_lower, prefix)
+            # DEFAULT: If it's a question or has multiple words, treat as search
+            elif len(text_lower.split()) >= 2:  # Multiple words = likely a search
+                intent = "default.search"
+                response = SearchRequest(text_lower)
             else:
-                math_expr = text_lower
+                intent = "default.unknown"
+                response = COMMAND_PROMPTS["unknown"]
+            stages["handler"] = time.perf_counter() - started
             
-            if math_expr:
-                return self.calculate(math_expr)
-            return "🧮 What should I calculate?"
-        
-        # READ NOTES
-        elif text_lower in ['read notes', 'show notes', 'my notes', 'notes']:
-            return self.read_notes()
-        
-        # TIME
-        elif any(word in text_lower for word in ['time', 'current time', 'what time']):
-            return self.get_time()
+            if trace is not None:
+                trace["intent"] = intent
         
-        # DATEX
-        elif any(word in text_lower for word in ['date', 'today', 'current date', 'what date']):
-            return self.get_date()
-        
-        # GREETINGS
-        elif any(word in text_lower for word in ['hello', 'hi', 'hey', 'greetings']):
-            return "👋 Hello! I can help you with tasks AND have natural conversations! Feel free to talk to me about anything!"
-        
-        # HELP
-        elif any(word in text_lower for word in ['help', 'what can you do', 'commands']):
-            return """🛠️ I can help you with:
-• 🔍 Search [anything]
-• 🌐 Open [website] 
-• 📝 Note [text]
-• 🧮 Calculate [math]
-• 📒 Read notes
-• 🕒 Time/date
-• 💬 Have conversations
-• 😄 Tell jokes
-• 🗣️ Chat freely
-
-I'm here to both assist you AND be your conversation partner!"""
-        
-        # THANKS
-        elif any(word in text_lower for word in ['thank', 'thanks']):
-            return "😊 You're welcome! I enjoy helping you and having conversations with you!"
-        
-        # DEFAULT: If it's a question or has multiple words, treat as search
-        else:
-            words = text_lower.split()
-            if len(words) >= 2:  # Multiple words = likely a search
-                return self.web_search(text_lower)
-            else:
-                return "🤔 Try: 'search [anything]', 'calculate [math]', 'note [text]', or just chat with me naturally!"
+        if trace is not None:
+            trace["stages"] = stages
+        return response
     
     def run_web(self):
         """Run the web interface"""
@@ -1187,6 +4056,57 @@ I'm here to both assist you AND be your conversation partner!"""
         print("🤖 Enhanced with Smart Chatbot - Can now have natural conversations!")
         self.app.run(host='0.0.0.0', port=5000, debug=False)
     
+    def build_asgi_app(self):
+        """Starlette app: /process runs on the event loop, every other route is the Flask app mounted as WSGI"""
+        import contextlib
+        from starlette.applications import Starlette
+        from starlette.responses import JSONResponse
+        from starlette.routing import Mount, Route
+        try:
+            from a2wsgi import WSGIMiddleware
+        except ImportError:
+            from starlette.middleware.wsgi import WSGIMiddleware
+        
+        async def process_command(request):
+            try:
+                data = await request.json()
+                text = data.get('text', '').strip()
+                
+                if not text:
+                    return JSONResponse({"error": "No text provided"}, status_code=400)
+                
+                response = await self.process_command_async(text, interrupt=False)
+                
+                return JSONResponse({
+                    "response": response,
+                    "status": "success"
+                })
+                
+            except Exception as e:
+                return JSONResponse({"error": str(e)}, status_code=500)
+        
+        @contextlib.asynccontextmanager
+        async def lifespan(app):
+            self.async_http = AsyncHttpClient(max_connections=self.async_http_max_connections, retries=self.http_retries)
+            try:
+                yield
+            finally:
+                await self.async_http.aclose()
+                self.async_http = None
+        
+        # Flask keeps serving the pages, voice and batch routes on WSGI worker threads
+        return Starlette(routes=[
+            Route('/process', process_command, methods=['POST']),
+            Mount('/', app=WSGIMiddleware(self.app)),
+        ], lifespan=lifespan)
+    
+    def run_asgi(self):
+        """Run the web interface on uvicorn, with searches for /process awaited on one event loop"""
+        import uvicorn
+        print("🌐 Starting Web Interface (ASGI) on http://localhost:5000")
+        print("💡 Open your browser and navigate to the above URL")
+        uvicorn.run(self.build_asgi_app(), host='0.0.0.0', port=5000, log_level="warning")
+    
     def run_text_mode(self):
         """Run in text input mode"""
         print("\n📝 Text Mode Activated")
@@ -1206,7 +4126,7 @@ I'm here to both assist you AND be your conversation partner!"""
                     break
                 
                 if user_input:
-                    response = self.process_command(user_input)
+                    response = self.process_command(user_input, interrupt=True)
                     
                     # Check for mode switching
                     if response == "voice_mode":
@@ -1224,9 +4144,91 @@ I'm here to both assist you AND be your conversation partner!"""
     
 
     
+    def run_voice_mode(self):
+        """Run a continuous hands-free loop on the local microphone"""
+        if self.text_only:
+            print("❌ Voice mode needs the voice engines, which --text-only never loads")
+            print("💡 Restart without --text-only to use the microphone")
+            return
+        
+        print("\n🎤 Voice Mode Activated")
+        print("💡 Speak naturally; say 'exit' or press Ctrl+C to stop\n")
+        
+        self.voice_mode_active = True
+        try:
+            self.open_microphone()
+        except Exception as e:
+            print(f"❌ Microphone error: {e}")
+            print("💡 Please check your microphone connection")
+            self.voice_mode_active = False
+            return
+        
+        # Capture runs on its own thread so the next utterance is recorded while this one is transcribed
+        utterances = deque(maxlen=self.mic_ring_size)
+        ready = threading.Condition()
+        stop = threading.Event()
+        
+        def capture_loop():
+            # There is no echo cancellation, so the microphone would hear the assistant's own replies:
+            # capture pauses during playback, and anything recorded while it was playing is dropped
+            while not stop.is_set():
+                if self.speakers_active(time.monotonic()):
+                    time.sleep(0.1)
+                    continue
+                started = time.monotonic()
+                try:
+                    audio = self.capture_utterance(timeout=1)
+                except Exception as e:
+                    print(f"❌ Listening error: {e}")
+                    time.sleep(0.5)
+                    continue
+                if audio is None or self.speakers_active(started):
+                    continue
+                with ready:
+                    if len(utterances) == utterances.maxlen:
+                        print("⚠️ Falling behind, dropping the oldest utterance")
+                    utterances.append(audio)
+                    ready.notify()
+        
+        capture_thread = threading.Thread(target=capture_loop, name="mic-capture", daemon=True)
+        capture_thread.start()
+        self.speak("Voice mode activated. I'm listening!")
+        
+        try:
+            while True:
+                with ready:
+                    while not utterances:
+                        ready.wait()
+                    audio = utterances.popleft()
+                
+                text = self.utterance_to_text(audio)
+                if not text:
+                    continue
+                print(f"📝 You said: {text}")
+                
+                if text.lower().strip(" .!?") in ['exit', 'quit', 'stop', 'goodbye']:
+                    self.speak("Goodbye!")
+                    print("👋 Voice mode stopped.")
+                    break
+                
+                response = self.process_command(text, interrupt=True)
+                self.speak(response)
+                
+        except KeyboardInterrupt:
+            print("\n👋 Voice mode stopped.")
+        finally:
+            stop.set()
+            capture_thread.join(timeout=2)
+            self.voice_mode_active = False
+            self.close_microphone()
+    
     def check_microphone(self):
         """Check if microphone is available and working"""
+        if self.text_only:
+            return False
+        
         try:
+            import speech_recognition as sr
             recognizer = sr.Recognizer()
             print("🔊 Testing microphone...")
             with sr.Microphone() as source:
@@ -1237,10 +4239,29 @@ I'm here to both assist you AND be your conversation partner!"""
             print(f"❌ Microphone not available: {e}")
             return False
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Free Voice AI Assistant")
+    parser.add_argument("--text-only", action="store_true",
+                        help="never load Whisper/TTS; serve text commands only")
+    parser.add_argument("--warm-tts", action="store_true",
+                        help="pre-render every canned response into the TTS cache at startup")
+    parser.add_argument("--asgi", action="store_true",
+                        help="serve the web interface with uvicorn so searches wait on an event loop (needs starlette, httpx, uvicorn)")
+    parser.add_argument("--import-knowledge", metavar="DUMP",
+                        help="load a Wikipedia abstracts XML or JSONL dump (optionally .gz) into the offline knowledge index, then exit")
+    return parser.parse_args(argv)
+
+
 def main():
     """Main function to run the assistant"""
+    args = parse_args()
+    
+    if args.import_knowledge:
+        import_knowledge(args.import_knowledge, KNOWLEDGE_PATH)
+        return
+    
     try:
-        assistant = FreeVoiceAIAssistant()
+        assistant = FreeVoiceAIAssistant(text_only=args.text_only, warm_tts=args.warm_tts)
         
         print("=" * 60)
         print("           FREE VOICE AI ASSISTANT - CHATBOT EDITION")
@@ -1248,9 +4269,12 @@ def main():
         
         print("\n🎮 Choose interface:")
         print("1. Web Interface (Browser) - Recommended")
+        print("4. Voice Mode (local microphone)")
         
        
         
+        run_web = assistant.run_asgi if args.asgi else assistant.run_web
+        
         try:
             choice = input("\nEnter 1 (default: 1): ").strip()
             
@@ -1258,13 +4282,13 @@ def main():
                 print("#")
                 print("🌐 Opening http://localhost:5000/voice-mode")
                 print("💡 The voice mode interface will open in your browser!")
-                assistant.run_web()
+                run_web()
             elif choice == "3":
                 assistant.run_text_mode()
             elif choice == "4":
                 assistant.run_voice_mode()
             else:
-                assistant.run_web()
+                run_web()
                 
         except Exception as e:
             print(f"❌ Failed to start assistant: {e}")